@@ -2,6 +2,7 @@ import platform
 import shutil
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from typing import Optional
 
@@ -90,6 +91,10 @@ class CliInputs(Enum):
     LIKE = 76
     DISLIKE = 68
     UPDATE_SUBSCRIPTION = 85
+    SEEK_BACK = 91
+    SEEK_FORWARD = 93
+    SEEK_BACK_LONG = 123
+    SEEK_FORWARD_LONG = 125
 
     def matches_input(self, keycode):
         return ord(keycode.upper()) == self.value
@@ -101,7 +106,9 @@ class CliManager:
                  scaling_factor,
                  max_frame_width,
                  should_use_subtitles,
-                 subtitles_lang):
+                 subtitles_lang,
+                 should_show_playback_stats=False,
+                 stream_quality_factor=2.):
         self._service_locator = service_locator
 
         self._scaling_factor = scaling_factor
@@ -110,9 +117,27 @@ class CliManager:
         self._should_use_subtitles = should_use_subtitles
         self._subtitles_lang = subtitles_lang
 
+        self._should_show_playback_stats = should_show_playback_stats
+
+        # Stream width needed per rendered char column.
+        self._stream_quality_factor = stream_quality_factor
+        self._current_video_metadata = None
+
+        # Videos resolved in the background while browsing, starting with the selected one.
+        self._prefetched_videos_count = 3
+
+        # Runs the steps of opening a video which playback does not have to wait for.
+        self._video_open_executor = ThreadPoolExecutor(max_workers=2)
+
+        # Set when a session expires during a request made off the main thread, which then handles logging in again.
+        self._session_expired_event = threading.Event()
+
         self._current_video_id = None
         self._current_video_creator_id = None
         self._current_video_rating = 'none'
+        self._current_video_duration = 0
+        # Seeks stop short of the end, so there is still something left to play after them.
+        self._seek_end_margin_seconds = 1.
 
         self._is_video_playing = False
 
@@ -133,7 +158,10 @@ class CliManager:
         self._cli_rows = cli_rows
         self._service_locator.video_rendering_manager.update_cli_dimensions(cli_cols, cli_rows)
 
-        self._service_locator.display_manager.set_display_dimensions(cli_cols, cli_rows)
+        self._service_locator.display_manager.set_display_dimensions(cli_rows, cli_cols)
+
+        if self._service_locator.display_manager.current_screen_tag == ScreenTags.VIDEO:
+            self._update_video_stream_format()
 
         if self._service_locator.display_manager.current_screen_tag == ScreenTags.HOME:
             self._navigate_to_other_video(
@@ -151,7 +179,7 @@ class CliManager:
 
     def run(self, video_url=None):
         self._service_locator.auth_manager.set_on_credentials_expired(
-            self._handle_login_flow
+            self._on_credentials_expired
         )
 
         if video_url is None:
@@ -170,8 +198,23 @@ class CliManager:
 
         while True:
             ch = getch()
+
+            # The key pressed after a session expired in the background only brings up the login flow.
+            if self._session_expired_event.is_set():
+                self._session_expired_event.clear()
+                self._handle_login_flow()
+                continue
+
             self._on_ch_callback(ch)
 
+    def _on_credentials_expired(self):
+        # Logging in prompts on the terminal and resets the screens, which only the main thread may do while it is
+        # reading input.
+        if threading.current_thread() is threading.main_thread():
+            self._handle_login_flow()
+        else:
+            self._session_expired_event.set()
+
     def _handle_login_flow(self):
         if not self._service_locator.auth_manager.is_authenticated():
             self._service_locator.display_manager.issue_message_to_screen(
@@ -203,20 +246,20 @@ class CliManager:
             self._service_locator.display_manager.set_screen_visibility(ScreenTags.VIDEO, True)
             self._service_locator.display_manager.set_active_screen(ScreenTags.VIDEO)
 
+            open_start_time = time.monotonic()
+
             current_video_metadata = self._service_locator.video_stream_manager.get_video_metadata(
-                screen_data['video_url'], self._should_use_subtitles, self._subtitles_lang)
+                screen_data['video_url'], self._should_use_subtitles, self._subtitles_lang,
+                self._get_min_stream_width())
 
+            self._current_video_metadata = current_video_metadata
             self._current_video_id = current_video_metadata['id']
             self._current_video_creator_id = current_video_metadata['creator_id']
+            self._current_video_duration = current_video_metadata['duration']
+            self._current_video_rating = 'none'
 
-            self._service_locator.video_subtitles_manager.set_subtitles_resource(
-                current_video_metadata['subtitles'], current_video_metadata['duration'])
-
-            if self._service_locator.auth_manager.is_authenticated():
-                self._current_video_rating = self._service_locator.youtube_connection_manager.get_video_rating(
-                    self._current_video_id)
-            else:
-                self._current_video_rating = 'none'
+            # Captions are attached right away and fill in while their file downloads.
+            self._service_locator.video_subtitles_manager.set_subtitles_resource(current_video_metadata['subtitles'])
 
             self._service_locator.video_rendering_manager.init_state({
                 'display_callback': self._service_locator.display_manager.render_screen,
@@ -224,30 +267,125 @@ class CliManager:
                 'target_fps': current_video_metadata['target_fps'],
                 'scaling_factor': self._scaling_factor,
                 'max_frame_width': self._max_frame_width,
-                'total_frames': current_video_metadata['target_fps'] * current_video_metadata['duration'],
+                'video_duration': current_video_metadata['duration'],
                 'video_title': current_video_metadata['title'],
                 'video_view_count': current_video_metadata['view_count'],
                 'video_creator': current_video_metadata['creator'],
-                'rating': self._current_video_rating
+                'rating': self._current_video_rating,
+                'should_show_playback_stats': self._should_show_playback_stats,
+                'open_start_time': open_start_time,
+                'open_timings': {
+                    'metadata': time.monotonic() - open_start_time
+                }
             })
 
+            # The new stream is handed over before resuming, so the stream thread never goes back to the previous one.
+            self._start_video_stream(current_video_metadata['stream_url'])
+
             self._set_video_playing_state(True)
 
-            self._service_locator.video_stream_manager.parse_video_stream(
-                stream_url=current_video_metadata['stream_url'],
-                frame_callback=self._service_locator.video_rendering_manager.render_frame)
+            # Neither is needed for the first frame, so the rating is loaded and the captions download is timed while
+            # the video is already playing.
+            self._service_locator.video_subtitles_manager.add_subtitles_loaded_callback(
+                current_video_metadata['subtitles'],
+                lambda: self._on_video_subtitles_loaded(current_video_metadata['id'], open_start_time))
+            if self._service_locator.auth_manager.is_authenticated():
+                self._video_open_executor.submit(self._load_video_rating, current_video_metadata['id'],
+                                                 open_start_time)
         else:
             screen_data = screen_data if screen_data is not None else dict()
             screen_data['screen_width'] = min(self._max_frame_width, self._cli_cols)
-            if 'thumbnail' in screen_data:
-                screen_data[
-                    'rendered_thumbnail'] = (
-                    self._service_locator.video_rendering_manager.ascii_converter.convert_frame_to_ascii(
-                        screen_data['thumbnail'], self._cli_cols, self._scaling_factor, self._max_frame_width
-                    ))
+            # A thumbnail which failed to download leaves an empty space, keeping the rest of the layout.
+            if 'thumbnail' in screen_data and screen_data['thumbnail'] is None:
+                screen_data['rendered_thumbnail'] = {
+                    'content': '',
+                    'width': screen_data['screen_width']
+                }
+            elif 'thumbnail' in screen_data:
+                screen_data['rendered_thumbnail'] = self._service_locator.video_rendering_manager.render_thumbnail(
+                    screen_data['url'], screen_data['thumbnail'], self._cli_cols, self._scaling_factor,
+                    self._max_frame_width)
             self._set_video_playing_state(False)
             self._service_locator.display_manager.render_screen(screen_data=screen_data)
 
+            self._prefetch_upcoming_videos()
+
+    def _prefetch_upcoming_videos(self):
+        youtube_connection_manager = self._service_locator.youtube_connection_manager
+        if youtube_connection_manager is None:
+            return
+
+        get_upcoming_results_callbacks = {
+            ScreenTags.HOME: youtube_connection_manager.get_upcoming_home_results,
+            ScreenTags.CREATOR: youtube_connection_manager.get_upcoming_creator_page_results,
+            ScreenTags.SEARCH: youtube_connection_manager.get_upcoming_search_results
+        }
+        get_upcoming_results_callback = get_upcoming_results_callbacks.get(
+            self._service_locator.display_manager.current_screen_tag)
+        if get_upcoming_results_callback is None:
+            return
+
+        upcoming_videos = get_upcoming_results_callback(self._prefetched_videos_count)
+        self._service_locator.video_stream_manager.prefetch_video_metadata(
+            [video_item.url for video_item in upcoming_videos], self._should_use_subtitles, self._subtitles_lang,
+            lambda video_info: self._service_locator.video_subtitles_manager.prefetch_subtitles_resource(
+                video_info['subtitles']))
+
+    def _on_video_subtitles_loaded(self, video_id, open_start_time):
+        # Another video may have been opened in the meantime.
+        if video_id != self._current_video_id:
+            return
+
+        self._service_locator.video_rendering_manager.update_open_timing('subtitles',
+                                                                         time.monotonic() - open_start_time)
+
+    def _load_video_rating(self, video_id, open_start_time):
+        try:
+            rating = self._service_locator.youtube_connection_manager.get_video_rating(video_id) or 'none'
+        except Exception:
+            # Nothing would see the error inside the executor, so the failure is shown in the playback stats instead.
+            if video_id == self._current_video_id:
+                self._service_locator.video_rendering_manager.update_open_timing('rating', None)
+            return
+
+        if video_id != self._current_video_id:
+            return
+
+        self._current_video_rating = rating
+        self._service_locator.video_rendering_manager.update_video_rating(rating)
+        self._service_locator.video_rendering_manager.update_open_timing('rating', time.monotonic() - open_start_time)
+
+    def _get_min_stream_width(self):
+        frame_width = int(self._cli_cols * self._scaling_factor)
+        if self._max_frame_width > 0:
+            frame_width = min(frame_width, self._max_frame_width)
+        return int(frame_width * self._stream_quality_factor)
+
+    def _start_video_stream(self, stream_url, start_position_seconds=0.):
+        self._service_locator.video_stream_manager.parse_video_stream(
+            stream_url=stream_url,
+            session_id=self._service_locator.video_rendering_manager.session_id,
+            frame_callback=self._service_locator.video_rendering_manager.render_frame,
+            should_drop_frame_callback=self._service_locator.video_rendering_manager.should_drop_frame,
+            seek_callback=self._service_locator.video_rendering_manager.on_seek,
+            start_position_seconds=start_position_seconds)
+
+    def _update_video_stream_format(self):
+        if self._current_video_metadata is None:
+            return
+
+        # Only streams with the same fps are considered, so frame counts keep matching the video timeline.
+        stream_format = self._service_locator.video_stream_manager.select_stream_format(
+            self._current_video_metadata['stream_formats'], self._get_min_stream_width(),
+            self._current_video_metadata['target_fps'])
+
+        if stream_format is None or stream_format['url'] == self._current_video_metadata['stream_url']:
+            return
+
+        self._current_video_metadata['stream_url'] = stream_format['url']
+        self._start_video_stream(stream_format['url'],
+                                 self._service_locator.video_rendering_manager.current_timestamp)
+
     def _set_video_playing_state(self, is_playing):
         self._is_video_playing = is_playing
         self._service_locator.video_rendering_manager.set_video_playing_state(is_playing)
@@ -280,6 +418,16 @@ class CliManager:
             self._on_key_dislike_pressed()
         elif CliInputs.UPDATE_SUBSCRIPTION.matches_input(ch):
             self._on_key_subscribe_pressed()
+        elif CliInputs.SEEK_BACK.matches_input(ch):
+            self._on_key_seek_pressed(-10)
+        elif CliInputs.SEEK_FORWARD.matches_input(ch):
+            self._on_key_seek_pressed(10)
+        elif CliInputs.SEEK_BACK_LONG.matches_input(ch):
+            self._on_key_seek_pressed(-60)
+        elif CliInputs.SEEK_FORWARD_LONG.matches_input(ch):
+            self._on_key_seek_pressed(60)
+        elif len(ch) == 1 and ch in '0123456789':
+            self._on_key_seek_to_percentage_pressed(int(ch) * 10)
         elif CliInputs.QUIT.matches_input(ch):
             quit()
 
@@ -371,6 +519,24 @@ class CliManager:
         if self._service_locator.display_manager.current_screen_tag == ScreenTags.VIDEO:
             self._set_video_playing_state(not self._is_video_playing)
 
+    def _seek_video(self, position_seconds):
+        position_seconds = max(0., position_seconds)
+        # Live streams have no known duration to clamp to.
+        if self._current_video_duration is not None:
+            position_seconds = min(position_seconds,
+                                   max(0., self._current_video_duration - self._seek_end_margin_seconds))
+        self._service_locator.video_stream_manager.seek(position_seconds)
+
+    def _on_key_seek_pressed(self, offset_seconds):
+        if self._service_locator.display_manager.current_screen_tag == ScreenTags.VIDEO:
+            self._seek_video(self._service_locator.video_rendering_manager.current_timestamp + offset_seconds)
+
+    def _on_key_seek_to_percentage_pressed(self, percentage):
+        if self._current_video_duration is None:
+            return
+        if self._service_locator.display_manager.current_screen_tag == ScreenTags.VIDEO:
+            self._seek_video(self._current_video_duration * percentage / 100)
+
     def _on_key_enter_pressed(self):
         if self._service_locator.display_manager.current_screen_tag == ScreenTags.HOME:
             self._navigate_to_current_video_screen(self._service_locator.youtube_connection_manager.get_home_result)
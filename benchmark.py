@@ -0,0 +1,145 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from service.render.AsciiFrameConverterUtil import AsciiFrameConverterUtil, ColorDepth
+from service.video import VideoStreamManager
+
+
+def load_frames(video_path, frame_count):
+    if video_path is None:
+        # Deterministic noisy gradients, so runs can be compared against each other.
+        rng = np.random.default_rng(0)
+        gradient = np.linspace(0, 255, 640, dtype=np.float32)[None, :, None]
+        return [np.clip(gradient + rng.normal(0, 40, (360, 640, 3)), 0, 255).astype(np.uint8)
+                for _ in range(frame_count)]
+
+    frames = list()
+    cv2_capture = cv2.VideoCapture(video_path)
+    while len(frames) < frame_count:
+        _, frame = cv2_capture.read()
+        if frame is None:
+            break
+        frames.append(frame)
+    cv2_capture.release()
+    return frames
+
+
+def time_conversion(converter, frames, cols):
+    outputs = list()
+    byte_count = 0
+    start_time = time.perf_counter()
+    for frame in frames:
+        frame_data = converter.convert_frame_to_ascii(frame, cols, 1., -1)
+        outputs.append(frame_data['content'])
+        byte_count += frame_data['byte_count']
+    elapsed_time = time.perf_counter() - start_time
+    return elapsed_time / len(frames) * 1000, byte_count / len(frames), outputs
+
+
+def benchmark_conversion(args):
+    frames = load_frames(args.video_path, args.frames)
+    if len(frames) == 0:
+        print('No frames could be loaded.')
+        return
+
+    results = dict()
+    for is_legacy in [True, False]:
+        converter = AsciiFrameConverterUtil(args.char_ratio, args.colors, args.high_accuracy, False, is_legacy)
+        results['legacy' if is_legacy else 'vectorized'] = time_conversion(converter, frames, args.cols)
+
+    for name, (ms_per_frame, bytes_per_frame, _) in results.items():
+        print(f'{name:>12}: {ms_per_frame:8.2f} ms/frame {bytes_per_frame:10.0f} bytes/frame')
+
+    is_identical = results['legacy'][2] == results['vectorized'][2]
+    print(f'Output identical: {is_identical}')
+
+
+def benchmark_color_depth(args):
+    frames = load_frames(args.video_path, args.frames)
+    if len(frames) == 0:
+        print('No frames could be loaded.')
+        return
+
+    for color_depth in ColorDepth:
+        converter = AsciiFrameConverterUtil(args.char_ratio, True, args.high_accuracy, False,
+                                            color_depth=color_depth)
+        ms_per_frame, bytes_per_frame, _ = time_conversion(converter, frames, args.cols)
+        print(f'{str(color_depth):>12}: {ms_per_frame:8.2f} ms/frame {bytes_per_frame:10.0f} bytes/frame')
+
+
+def benchmark_idle(args):
+    video_stream_manager = VideoStreamManager()
+    if args.video_path is not None:
+        video_stream_manager.parse_video_stream(args.video_path, 0, lambda frame, timestamp, session_id: None)
+        video_stream_manager.set_video_state(False)
+
+    start_cpu_time = time.process_time()
+    start_time = time.perf_counter()
+    time.sleep(args.duration)
+    cpu_time = time.process_time() - start_cpu_time
+    elapsed_time = time.perf_counter() - start_time
+
+    state = 'paused' if args.video_path is not None else 'idle'
+    print(f'{state:>12}: {cpu_time / elapsed_time * 100:8.2f} % CPU over {elapsed_time:.1f}s')
+
+
+def add_frame_source_arguments(parser):
+    parser.add_argument('--video-path', '-p',
+                        help="Video file or URL to read frames from. Synthetic frames if missing.",
+                        type=str,
+                        default=None)
+    parser.add_argument('--frames', '-n',
+                        help="Number of frames to convert.",
+                        type=int,
+                        default=50)
+    parser.add_argument('--cols',
+                        help="Terminal width in chars to render for.",
+                        type=int,
+                        default=200)
+    parser.add_argument('--char-ratio', '-r',
+                        help="CLI characters aspect ratio.",
+                        type=float,
+                        default=.6)
+    parser.add_argument('--high-accuracy', '-a',
+                        help="Benchmark Unicode character rendering.",
+                        action='store_true')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    conversion_parser = subparsers.add_parser('conversion',
+                                              help="Compare the legacy and vectorized frame conversion paths.")
+    add_frame_source_arguments(conversion_parser)
+    conversion_parser.add_argument('--colors', '-c',
+                                   help="Benchmark color rendering.",
+                                   action='store_true')
+    conversion_parser.set_defaults(handler=benchmark_conversion)
+
+    color_depth_parser = subparsers.add_parser('color-depth',
+                                               help="Compare the color depths of the vectorized conversion path.")
+    add_frame_source_arguments(color_depth_parser)
+    color_depth_parser.set_defaults(handler=benchmark_color_depth)
+
+    idle_parser = subparsers.add_parser('idle',
+                                        help="Measure the CPU used by the video stream thread while nothing plays.")
+    idle_parser.add_argument('--video-path', '-p',
+                             help="Video file or URL to open and pause. Nothing is opened if missing.",
+                             type=str,
+                             default=None)
+    idle_parser.add_argument('--duration', '-d',
+                             help="Seconds to measure for.",
+                             type=float,
+                             default=5.)
+    idle_parser.set_defaults(handler=benchmark_idle)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
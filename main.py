@@ -2,6 +2,7 @@ import argparse
 
 from CliManager import CliManager
 from service import ServiceLocator
+from service.render import ColorDepth
 
 
 def main():
@@ -39,6 +40,12 @@ def main():
                         help="Use colors when rendering. *Warning: Performance-heavy.",
                         action='store_true'
                         )
+    parser.add_argument('--color-depth',
+                        help="Color depth used when rendering with colors. Implies --colors.",
+                        type=str,
+                        choices=[str(color_depth) for color_depth in ColorDepth],
+                        default=None
+                        )
     parser.add_argument('--high-accuracy', '-a',
                         help="High accuracy rendering. "
                              "Will use Unicode characters instead of base ASCII for rendering images.",
@@ -49,10 +56,37 @@ def main():
                              "To be used if background is lighter than characters.",
                         action='store_true'
                         )
+    parser.add_argument('--legacy-conversion',
+                        help="Use the original per-pixel frame conversion instead of the vectorized one. "
+                             "Meant for comparing output and performance. Only supports the 8 color depth.",
+                        action='store_true'
+                        )
+    parser.add_argument('--workers',
+                        help="Number of processes converting video frames in parallel. "
+                             "Worth it for large terminals in color mode.",
+                        type=int,
+                        default=1
+                        )
+    parser.add_argument('--show-stats',
+                        help="Show rendered and dropped frame counts, the current playback lag and how long each step "
+                             "of opening the video took under the video.",
+                        action='store_true'
+                        )
+    parser.add_argument('--stream-quality', '-q',
+                        help="Minimum video stream width per rendered character column. "
+                             "The smallest stream at least this wide is used, to save bandwidth and decoding.",
+                        type=float,
+                        default=2.
+                        )
     args = parser.parse_args()
 
-    service_locator = ServiceLocator(args.char_ratio, args.colors, args.high_accuracy, args.invert_colors)
-    cli_manager = CliManager(service_locator, args.scaling_factor, args.max_width, args.subtitles, args.subtitles_lang)
+    should_use_colors = args.colors or args.color_depth is not None
+    color_depth = ColorDepth(args.color_depth) if args.color_depth is not None else ColorDepth.ANSI_8
+
+    service_locator = ServiceLocator(args.char_ratio, should_use_colors, args.high_accuracy, args.invert_colors,
+                                     args.legacy_conversion, color_depth, args.workers)
+    cli_manager = CliManager(service_locator, args.scaling_factor, args.max_width, args.subtitles, args.subtitles_lang,
+                             args.show_stats, args.stream_quality)
 
     try:
         cli_manager.run(video_url=args.video_url)
@@ -2,7 +2,7 @@ from typing import Optional
 
 from service.auth import AuthManager
 from service.display import DisplayManager
-from service.render import VideoRenderingManager
+from service.render import VideoRenderingManager, ColorDepth
 from service.search import SearchBarManager
 from service.subtitle import VideoSubtitlesManager
 from service.video import VideoStreamManager
@@ -10,11 +10,13 @@ from service.youtube import YoutubeConnectionManager
 
 
 class ServiceLocator:
-    def __init__(self, char_aspect_ratio, should_use_colors, should_render_high_accuracy, should_invert_colors):
+    def __init__(self, char_aspect_ratio, should_use_colors, should_render_high_accuracy, should_invert_colors,
+                 should_use_legacy_conversion=False, color_depth=ColorDepth.ANSI_8, workers=1):
         self._display_manager = DisplayManager()
         self._video_rendering_manager = VideoRenderingManager(char_aspect_ratio, should_use_colors,
-                                                              should_render_high_accuracy, should_invert_colors)
-        self._video_stream_manager = VideoStreamManager()
+                                                              should_render_high_accuracy, should_invert_colors,
+                                                              should_use_legacy_conversion, color_depth, workers)
+        self._video_stream_manager = VideoStreamManager(self._video_rendering_manager.max_held_frames)
         self._video_subtitles_manager = VideoSubtitlesManager()
         self._auth_manager = AuthManager()
         self._search_bar_manager = SearchBarManager()
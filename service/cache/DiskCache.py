@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class DiskCache:
+    def __init__(self, cache_dir, max_size_bytes):
+        self.lock = threading.Lock()
+
+        self._cache_dir = Path(cache_dir)
+        self._max_size_bytes = max_size_bytes
+
+        # File name to size, least recently used first.
+        self._entries = OrderedDict()
+        self._total_size = 0
+
+        self._load_entries()
+
+    def _load_entries(self):
+        if not self._cache_dir.exists():
+            return
+
+        files = [file for file in self._cache_dir.iterdir() if file.is_file() and not file.name.endswith('.tmp')]
+        for file in sorted(files, key=lambda cached_file: cached_file.stat().st_mtime):
+            size = file.stat().st_size
+            self._entries[file.name] = size
+            self._total_size += size
+
+    def _get_file_name(self, key):
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _remove_entry(self, file_name):
+        self._total_size -= self._entries.pop(file_name)
+        try:
+            os.remove(self._cache_dir / file_name)
+        except OSError:
+            pass
+
+    def get(self, key):
+        file_name = self._get_file_name(key)
+
+        with self.lock:
+            if file_name not in self._entries:
+                return None
+
+            try:
+                with open(self._cache_dir / file_name, 'rb') as cached_file:
+                    data = cached_file.read()
+                # Access time is kept in the mtime, so LRU order survives restarts.
+                os.utime(self._cache_dir / file_name)
+            except OSError:
+                self._remove_entry(file_name)
+                return None
+
+            self._entries.move_to_end(file_name)
+            return data
+
+    def put(self, key, data: bytes):
+        file_name = self._get_file_name(key)
+
+        # Entries that could never fit are not worth evicting everything else for.
+        if len(data) > self._max_size_bytes:
+            return
+
+        with self.lock:
+            if file_name in self._entries:
+                self._remove_entry(file_name)
+
+            while len(self._entries) > 0 and self._total_size + len(data) > self._max_size_bytes:
+                self._remove_entry(next(iter(self._entries)))
+
+            try:
+                self._cache_dir.mkdir(exist_ok=True, parents=True)
+                tmp_path = self._cache_dir / f'{file_name}.tmp'
+                with open(tmp_path, 'wb') as cached_file:
+                    cached_file.write(data)
+                os.replace(tmp_path, self._cache_dir / file_name)
+            except OSError:
+                return
+
+            self._entries[file_name] = len(data)
+            self._total_size += len(data)
+
+    def remove(self, key):
+        file_name = self._get_file_name(key)
+
+        with self.lock:
+            if file_name in self._entries:
+                self._remove_entry(file_name)
@@ -0,0 +1 @@
+from .DiskCache import DiskCache
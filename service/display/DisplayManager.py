@@ -3,6 +3,7 @@ import sys
 from enum import Enum
 from typing import Optional
 
+from service.display.FrameDeltaRenderer import FrameDeltaRenderer
 from service.display.screen import HomeScreen, CreatorScreen, SearchScreen, VideoScreen, BaseScreen
 from util import str_list_to_lines, get_menu_item_str, get_newline
 
@@ -30,13 +31,16 @@ class DisplayManager:
         self._video_has_played = False
         self._creator_was_shown = False
 
+        # Shared by all screens, as they all draw to the same terminal.
+        self._frame_delta_renderer = FrameDeltaRenderer()
+
         # Dict where values are the screen and whether it's visible
         self._registered_screens: dict[ScreenTags, [BaseScreen, bool]] = {
             ScreenTags.NONE: [None, False],
-            ScreenTags.HOME: [HomeScreen(), False],
-            ScreenTags.CREATOR: [CreatorScreen(), False],
-            ScreenTags.SEARCH: [SearchScreen(), False],
-            ScreenTags.VIDEO: [VideoScreen(), False],
+            ScreenTags.HOME: [HomeScreen(self._frame_delta_renderer), False],
+            ScreenTags.CREATOR: [CreatorScreen(self._frame_delta_renderer), False],
+            ScreenTags.SEARCH: [SearchScreen(self._frame_delta_renderer), False],
+            ScreenTags.VIDEO: [VideoScreen(self._frame_delta_renderer), False],
         }
 
     def _update_menu_str(self):
@@ -54,6 +58,7 @@ class DisplayManager:
     def set_display_dimensions(self, height, width):
         self._display_height = height
         self._display_width = width
+        self._frame_delta_renderer.set_display_height(height)
         self._update_menu_str()
 
     def set_active_screen(self, screen_tag: ScreenTags):
@@ -62,6 +67,7 @@ class DisplayManager:
 
         # Hard clear screen depending on os.
         os.system('cls' if os.name == 'nt' else 'clear')
+        self._frame_delta_renderer.reset()
 
         self._active_screen_tag = screen_tag
         self._active_screen = self._registered_screens[screen_tag][0]
@@ -78,6 +84,7 @@ class DisplayManager:
 
         clear = '\033c'
         sys.stdout.write(f"{clear}{msg}{get_newline()}")
+        self._frame_delta_renderer.reset()
 
     def can_navigate_to_screen(self, screen_tag: ScreenTags):
         return self._registered_screens[screen_tag][1]
@@ -0,0 +1,93 @@
+import threading
+import unicodedata
+
+from util import get_newline
+
+
+class FrameDeltaRenderer:
+    # Above this ratio of changed rows, redrawing everything is cheaper than positioning the cursor per row.
+    _FULL_REDRAW_THRESHOLD = 0.6
+
+    _ESCAPE_CHAR = '\033'
+    _CURSOR_HOME = '\033[H'
+    _CLEAR_TO_LINE_END = '\033[K'
+    _CLEAR_TO_SCREEN_END = '\033[J'
+
+    # East Asian width classes taking up exactly one terminal column, ambiguous ones depend on the terminal.
+    _SINGLE_WIDTH_CLASSES = ('Na', 'H', 'N')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self._previous_lines = None
+        self._display_height = 0
+
+    def _move_cursor(self, row, col):
+        return f'\033[{row + 1};{col + 1}H'
+
+    def _full_redraw(self, lines):
+        newline = get_newline()
+        return (f'{self._CURSOR_HOME}'
+                f'{newline.join(line + self._CLEAR_TO_LINE_END for line in lines)}'
+                f'{self._CLEAR_TO_SCREEN_END}')
+
+    def _is_single_width(self, line):
+        # Char indexes only match terminal columns if no char is wide or combining.
+        return line.isascii() or all(unicodedata.east_asian_width(char) in self._SINGLE_WIDTH_CLASSES
+                                     and not unicodedata.combining(char) for char in line)
+
+    def _redraw_line(self, row, previous_line, line):
+        is_plain = self._ESCAPE_CHAR not in line and self._ESCAPE_CHAR not in previous_line
+        if (not is_plain or len(line) != len(previous_line)
+                or not self._is_single_width(line) or not self._is_single_width(previous_line)):
+            return f'{self._move_cursor(row, 0)}{line}{self._CLEAR_TO_LINE_END}'
+
+        # Same length, no escapes and one column per char, so only the span between the first and last changed chars
+        # is rewritten.
+        first_changed = 0
+        while line[first_changed] == previous_line[first_changed]:
+            first_changed += 1
+        last_changed = len(line) - 1
+        while line[last_changed] == previous_line[last_changed]:
+            last_changed -= 1
+
+        return f'{self._move_cursor(row, first_changed)}{line[first_changed:last_changed + 1]}'
+
+    def reset(self):
+        with self.lock:
+            self._previous_lines = None
+
+    def set_display_height(self, height):
+        with self.lock:
+            self._display_height = height
+            self._previous_lines = None
+
+    def _render(self, data: str):
+        lines = data.split(get_newline())
+
+        previous_lines = self._previous_lines
+        self._previous_lines = lines
+
+        # Cursor positioning is only reliable if the whole frame fits without scrolling the terminal.
+        if (previous_lines is None or len(previous_lines) != len(lines)
+                or 0 < self._display_height < len(lines)):
+            return self._full_redraw(lines)
+
+        changed_rows = [row for row, (previous_line, line) in enumerate(zip(previous_lines, lines))
+                        if previous_line != line]
+
+        if len(changed_rows) > len(lines) * self._FULL_REDRAW_THRESHOLD:
+            return self._full_redraw(lines)
+
+        if len(changed_rows) == 0:
+            return ''
+
+        return (''.join(self._redraw_line(row, previous_lines[row], lines[row]) for row in changed_rows)
+                + self._move_cursor(len(lines) - 1, len(lines[-1])))
+
+    def write(self, data: str, stream):
+        # The diff and the write happen under the same lock, so frames written from different threads never reach
+        # the terminal in another order than the one they were diffed in.
+        with self.lock:
+            stream.write(self._render(data))
+            stream.flush()
@@ -4,8 +4,9 @@ from util import get_newline
 
 
 class BaseScreen:
-    def __init__(self):
+    def __init__(self, frame_delta_renderer):
         self._menu_str = ''
+        self._frame_delta_renderer = frame_delta_renderer
 
     def render(self, data, menu_str):
         self._menu_str = menu_str
@@ -13,6 +14,4 @@ class BaseScreen:
     def write_to_screen(self, data: str):
         data = data + get_newline() if len(data) > 0 and not data.endswith(get_newline()) else data
 
-        clear = '\033c'
-        sys.stdout.write(f"{clear}{data}{self._menu_str}{get_newline()}")
-
+        self._frame_delta_renderer.write(f"{data}{self._menu_str}{get_newline()}", sys.stdout)
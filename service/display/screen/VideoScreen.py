@@ -20,6 +20,23 @@ class VideoScreen(BaseScreen):
             f'{self._PLAYBACK_CURSOR_CHAR}'
             f'{self._PLAYBACK_NOT_YET_CONSUMED_CHAR * not_consumed_len} {get_newline()}')
 
+    def _create_playback_stats_str(self, width, playback_stats):
+        stats_str = (f"Rendered: {playback_stats['rendered_frames']} | "
+                     f"Dropped: {playback_stats['dropped_frames']} | "
+                     f"Lag: {playback_stats['lag']:.2f}s")
+        render_str = f" {get_ellipsized_str(stats_str, width - 2)} {get_newline()}"
+
+        # Time taken by each step of opening the video, in the order they finished.
+        open_timings = playback_stats.get('open_timings', {})
+        if len(open_timings) > 0:
+            # Steps which failed have no timing.
+            timings_str = ' | '.join(f"{step.replace('_', ' ').capitalize()}: "
+                                     + (f"{seconds:.2f}s" if seconds is not None else 'failed')
+                                     for step, seconds in open_timings.items())
+            render_str += f" {get_ellipsized_str(timings_str, width - 2)} {get_newline()}"
+
+        return render_str
+
     def render(self, data, menu_str):
         super().render(data, menu_str)
 
@@ -33,6 +50,7 @@ class VideoScreen(BaseScreen):
         video_creator = data['video_creator']
         rating = data['rating']
         subtitles = data.get('subtitles', None)
+        playback_stats = data.get('playback_stats', None)
 
         if rating == 'like':
             rating = 'L'
@@ -54,6 +72,10 @@ class VideoScreen(BaseScreen):
             # Add playback bar and status.
             render_str += self._create_video_status_bar(screen_width, percent_watched, is_playing)
 
+            # Add playback stats, if enabled.
+            if playback_stats is not None:
+                render_str += self._create_playback_stats_str(screen_width, playback_stats)
+
             # Add video title, ellipsized if necessary.
             render_str += f" {get_ellipsized_str(video_title, screen_width - 2)} {get_newline()}"
 
@@ -1,8 +1,21 @@
+import threading
+from enum import Enum
+
 import cv2
+import numpy as np
 
 from util import get_newline
 
 
+class ColorDepth(Enum):
+    ANSI_8 = '8'
+    XTERM_256 = '256'
+    TRUECOLOR = 'truecolor'
+
+    def __str__(self):
+        return '%s' % self.value
+
+
 class ANSIConstants:
     # Approximate colors, used for fast mappings.
     COLORS = {
@@ -18,6 +31,46 @@ class ANSIConstants:
 
     RESET = '\033[0m'
 
+    COLOR_LUT_BINS = 32
+
+    @staticmethod
+    def build_color_lut(colors, bins=COLOR_LUT_BINS):
+        # Palette index for every quantized color, indexed as [b, g, r] to match OpenCV frames.
+        step = 256 // bins
+        levels = np.arange(bins, dtype=np.int32) * step + step // 2
+        blue, green, red = np.meshgrid(levels, levels, levels, indexing='ij')
+
+        color_lut = np.zeros((bins, bins, bins), dtype=np.uint16)
+        min_distance = np.full((bins, bins, bins), np.iinfo(np.int32).max, dtype=np.int32)
+        for index, (mapped_red, mapped_green, mapped_blue) in enumerate(colors):
+            distance = np.abs(red - mapped_red) + np.abs(green - mapped_green) + np.abs(blue - mapped_blue)
+            is_closer = distance < min_distance
+            color_lut[is_closer] = index
+            min_distance[is_closer] = distance[is_closer]
+        return color_lut
+
+    @staticmethod
+    def xterm_256_colors():
+        # Only the 6x6x6 cube and the gray ramp, entries 0-15 depend on the terminal theme.
+        cube_levels = [0, 95, 135, 175, 215, 255]
+        colors = dict()
+        for red in range(6):
+            for green in range(6):
+                for blue in range(6):
+                    rgb = (cube_levels[red], cube_levels[green], cube_levels[blue])
+                    colors[rgb] = f'\033[38;5;{16 + 36 * red + 6 * green + blue}m'
+        for gray in range(24):
+            level = 8 + 10 * gray
+            colors[(level, level, level)] = f'\033[38;5;{232 + gray}m'
+        return colors
+
+    @staticmethod
+    def truecolor_escapes(bins=COLOR_LUT_BINS):
+        # Escape for every quantized color, indexed by (b << 2x) | (g << x) | r with x bits per channel.
+        levels = [round(level * 255 / (bins - 1)) for level in range(bins)]
+        return np.array([f'\033[38;2;{red};{green};{blue}m'
+                         for blue in levels for green in levels for red in levels])
+
     @staticmethod
     def closest_ansi_color(pixel):
         min_distance = float('inf')
@@ -31,9 +84,12 @@ class ANSIConstants:
 
 
 class AsciiFrameConverterUtil:
-    def __init__(self, char_aspect_ratio, should_use_color, should_render_high_accuracy, should_invert_colors):
+    def __init__(self, char_aspect_ratio, should_use_color, should_render_high_accuracy, should_invert_colors,
+                 should_use_legacy_conversion=False, color_depth=ColorDepth.ANSI_8):
         self._char_aspect_ratio = char_aspect_ratio
         self._should_use_color = should_use_color
+        self._color_depth = color_depth
+        self._should_use_legacy_conversion = should_use_legacy_conversion
 
         if should_render_high_accuracy:
             self._ASCII_CHARS = ' ░▒▓█'
@@ -43,13 +99,38 @@ class AsciiFrameConverterUtil:
         if should_invert_colors:
             self._ASCII_CHARS = self._ASCII_CHARS[::-1]
 
+        # Maps every possible gray level straight to its glyph, using the same rounding as the legacy path.
+        max_intensity = len(self._ASCII_CHARS) - 1
+        self._intensity_lut = np.array([int(level / 255 * max_intensity) for level in range(256)], dtype=np.uint8)
+        self._glyph_lut = np.array(list(self._ASCII_CHARS))[self._intensity_lut]
+
+        # Built once from the configured palette, so per-frame cost does not depend on its size.
+        self._color_lut_bits = int(np.log2(ANSIConstants.COLOR_LUT_BINS))
+        self._color_lut = None
+        self._color_escapes = None
+        if should_use_color:
+            if color_depth == ColorDepth.TRUECOLOR:
+                self._color_escapes = ANSIConstants.truecolor_escapes()
+            else:
+                palette = ANSIConstants.xterm_256_colors() if color_depth == ColorDepth.XTERM_256 \
+                    else ANSIConstants.COLORS
+                self._color_lut = ANSIConstants.build_color_lut(palette.keys())
+                self._color_escapes = np.array(list(palette.values()))
+
+        self._last_frame_byte_count = 0
+
+        # Destination buffers reused across frames, OpenCV only reallocates them when the frame geometry changes.
+        self.lock = threading.Lock()
+        self._gray_frame = None
+        self._resized_gray_frame = None
+        self._resized_frame = None
+        self._quantized_frame = None
+
     def _get_color_char(self, pixel_group, char):
         closest_ansi_color = ANSIConstants.closest_ansi_color(pixel_group)
         return f'{closest_ansi_color}{char}{ANSIConstants.RESET}'
 
-    def convert_frame_to_ascii(self, frame, cols, scale_factor, max_frame_width):
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
+    def _get_frame_dimensions(self, frame, cols, scale_factor, max_frame_width):
         width = int(cols * scale_factor)
 
         if max_frame_width > 0:
@@ -58,6 +139,10 @@ class AsciiFrameConverterUtil:
         aspect_ratio = frame.shape[1] / frame.shape[0]
         height = int((width / aspect_ratio) * self._char_aspect_ratio)
 
+        return width, height
+
+    def _convert_frame_to_ascii_legacy(self, frame, width, height):
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         resized_frame = cv2.resize(gray_frame, (width, height))
 
         if self._should_use_color:
@@ -74,7 +159,61 @@ class AsciiFrameConverterUtil:
                 ascii_frame += char
             ascii_frame += get_newline()
 
+        return ascii_frame
+
+    def _convert_frame_to_ascii_vectorized(self, frame, width, height):
+        newline = get_newline()
+        if height <= 0:
+            return ''
+
+        # Converted to gray before downscaling, like the legacy path, so both produce the same chars.
+        self._gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray_frame)
+        self._resized_gray_frame = cv2.resize(self._gray_frame, (width, height), dst=self._resized_gray_frame)
+        resized_frame = self._resized_gray_frame
+
+        if not self._should_use_color:
+            return newline.join(map(''.join, self._glyph_lut[resized_frame].tolist())) + newline
+
+        self._resized_frame = cv2.resize(frame, (width, height), dst=self._resized_frame)
+        if self._quantized_frame is None or self._quantized_frame.shape != self._resized_frame.shape:
+            self._quantized_frame = np.empty_like(self._resized_frame)
+        quantized_frame = np.right_shift(self._resized_frame, 8 - self._color_lut_bits, out=self._quantized_frame)
+        if self._color_lut is None:
+            quantized_frame = quantized_frame.astype(np.int32)
+            color_indices = ((quantized_frame[..., 0] << (2 * self._color_lut_bits))
+                             | (quantized_frame[..., 1] << self._color_lut_bits)
+                             | quantized_frame[..., 2])
+        else:
+            color_indices = self._color_lut[quantized_frame[..., 0], quantized_frame[..., 1], quantized_frame[..., 2]]
+
+        # Color escapes are only emitted where the color changes along a row, with a single reset per line.
+        is_run_start = np.ones(color_indices.shape, dtype=bool)
+        is_run_start[:, 1:] = color_indices[:, 1:] != color_indices[:, :-1]
+
+        escapes = np.where(is_run_start, self._color_escapes[color_indices], '')
+        cells = np.stack((escapes, self._glyph_lut[resized_frame]), axis=-1).reshape(height, -1)
+
+        line_end = ANSIConstants.RESET + newline
+        return line_end.join(map(''.join, cells.tolist())) + line_end
+
+    def convert_frame_to_ascii(self, frame, cols, scale_factor, max_frame_width):
+        width, height = self._get_frame_dimensions(frame, cols, scale_factor, max_frame_width)
+
+        if self._should_use_legacy_conversion:
+            ascii_frame = self._convert_frame_to_ascii_legacy(frame, width, height)
+        else:
+            # Video frames and thumbnails may be converted from different threads, sharing the buffers.
+            with self.lock:
+                ascii_frame = self._convert_frame_to_ascii_vectorized(frame, width, height)
+
+        self._last_frame_byte_count = len(ascii_frame.encode())
+
         return {
             'content': ascii_frame,
-            'width': width
+            'width': width,
+            'byte_count': self._last_frame_byte_count
         }
+
+    @property
+    def last_frame_byte_count(self):
+        return self._last_frame_byte_count
@@ -0,0 +1,41 @@
+import threading
+
+
+class FrameConversionThread(threading.Thread):
+    def __init__(self, frame_queue, display_queue, convert_frame_callback, should_drop_frame_callback):
+        super().__init__()
+
+        self.stop_event = threading.Event()
+
+        self._frame_queue = frame_queue
+        self._display_queue = display_queue
+        self._convert_frame_callback = convert_frame_callback
+        self._should_drop_frame_callback = should_drop_frame_callback
+
+    def _take_frame(self, block=True):
+        # Returns the next frame to convert, or None if there is none to convert this time around.
+        # Raises queue.Empty if not blocking and nothing is queued.
+        item = self._frame_queue.get(block=block)
+        if item is None:
+            return None
+
+        # A late frame is only skipped if a newer one is waiting.
+        session_id, frame, timestamp = item
+        if not self._frame_queue.empty() and self._should_drop_frame_callback(timestamp):
+            return None
+
+        return item
+
+    def run(self):
+        while not self.stop_event.is_set():
+            item = self._take_frame()
+            if item is None:
+                continue
+
+            session_id, frame, timestamp = item
+            display_frame_data = self._convert_frame_callback(frame)
+            self._display_queue.put((session_id, display_frame_data, timestamp))
+
+    def stop(self):
+        self.stop_event.set()
+        self._frame_queue.put(None)
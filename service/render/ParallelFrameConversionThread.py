@@ -0,0 +1,148 @@
+import atexit
+import multiprocessing
+import queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from service.render.AsciiFrameConverterUtil import AsciiFrameConverterUtil
+from service.render.FrameConversionThread import FrameConversionThread
+
+# Per worker process state, set up once by the pool initializer.
+_worker_converter = None
+_worker_frame_buffers = dict()
+
+# Buffers are replaced when the frame size grows, so stale attachments are dropped past this count.
+_MAX_WORKER_FRAME_BUFFERS = 32
+
+
+def _init_worker(converter_args):
+    global _worker_converter
+    _worker_converter = AsciiFrameConverterUtil(*converter_args)
+
+
+def _convert_shared_frame(buffer_name, frame_shape, cols, scale_factor, max_frame_width):
+    frame_buffer = _worker_frame_buffers.get(buffer_name)
+    if frame_buffer is None:
+        if len(_worker_frame_buffers) >= _MAX_WORKER_FRAME_BUFFERS:
+            _release_worker_frame_buffers()
+        frame_buffer = shared_memory.SharedMemory(name=buffer_name)
+        _worker_frame_buffers[buffer_name] = frame_buffer
+
+    frame = np.ndarray(frame_shape, dtype=np.uint8, buffer=frame_buffer.buf)
+    return _worker_converter.convert_frame_to_ascii(frame, cols, scale_factor, max_frame_width)
+
+
+def _release_worker_frame_buffers():
+    for frame_buffer in _worker_frame_buffers.values():
+        frame_buffer.close()
+    _worker_frame_buffers.clear()
+
+
+class ParallelFrameConversionThread(FrameConversionThread):
+    # In flight frames per worker, enough to keep every worker busy while results are handed out in order.
+    _FRAMES_IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, frame_queue, display_queue, converter_args, workers, get_conversion_params_callback,
+                 convert_frame_callback, should_drop_frame_callback):
+        # Frames are converted in this thread with convert_frame_callback instead, should the pool break.
+        super().__init__(frame_queue, display_queue, convert_frame_callback, should_drop_frame_callback)
+
+        self._get_conversion_params_callback = get_conversion_params_callback
+
+        # Spawned rather than forked, as the parent process is running several threads.
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker,
+                                             initargs=(converter_args,))
+        self._max_frames_in_flight = workers * self._FRAMES_IN_FLIGHT_PER_WORKER
+
+        self._frame_buffers = list()
+        self._free_frame_buffers = list()
+        self._frame_buffer_size = 0
+
+        # Kept in submission order, so results reach the display in frame order whichever worker finishes first.
+        self._pending_frames = deque()
+
+        atexit.register(self._release_frame_buffers)
+
+    def _release_frame_buffers(self):
+        for frame_buffer in self._frame_buffers:
+            frame_buffer.close()
+            frame_buffer.unlink()
+        self._frame_buffers.clear()
+        self._free_frame_buffers.clear()
+
+    def _ensure_frame_buffers(self, frame_size):
+        if frame_size <= self._frame_buffer_size:
+            return
+
+        # Buffers can only be replaced once no worker is reading from them.
+        while len(self._pending_frames) > 0:
+            self._hand_out_oldest_frame()
+
+        self._release_frame_buffers()
+        self._frame_buffers = [shared_memory.SharedMemory(create=True, size=frame_size)
+                               for _ in range(self._max_frames_in_flight)]
+        self._free_frame_buffers = list(self._frame_buffers)
+        self._frame_buffer_size = frame_size
+
+    def _submit_frame(self, session_id, frame, timestamp):
+        self._ensure_frame_buffers(frame.nbytes)
+
+        frame_buffer = self._free_frame_buffers.pop()
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=frame_buffer.buf)[...] = frame
+
+        future = self._executor.submit(_convert_shared_frame, frame_buffer.name, frame.shape,
+                                       *self._get_conversion_params_callback())
+        self._pending_frames.append((session_id, timestamp, future, frame_buffer))
+
+    def _hand_out_oldest_frame(self):
+        session_id, timestamp, future, frame_buffer = self._pending_frames.popleft()
+        try:
+            display_frame_data = future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception:
+            # A frame which failed to convert is skipped, the next one takes its place on screen.
+            return
+        finally:
+            self._free_frame_buffers.append(frame_buffer)
+
+        self._display_queue.put((session_id, display_frame_data, timestamp))
+
+    def _convert_frames_in_pool(self):
+        while not self.stop_event.is_set():
+            if len(self._pending_frames) >= self._max_frames_in_flight:
+                self._hand_out_oldest_frame()
+                continue
+
+            # Without new frames to submit, waiting on the oldest result is the only useful thing to do.
+            try:
+                item = self._take_frame(block=len(self._pending_frames) == 0)
+            except queue.Empty:
+                self._hand_out_oldest_frame()
+                continue
+
+            if item is None:
+                continue
+
+            self._submit_frame(*item)
+
+    def run(self):
+        try:
+            self._convert_frames_in_pool()
+        except BrokenProcessPool:
+            # A worker died, so playback carries on without the pool rather than freezing.
+            self._pending_frames.clear()
+            super().run()
+        except RuntimeError:
+            # The pool is shut down along with the interpreter, while this daemon thread may still be submitting.
+            return
+
+    def stop(self):
+        super().stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+
+class PlaybackClock:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self._frame_interval = None
+
+        # Wall time at which the reference frame is due, every other frame is scheduled relative to it by its
+        # presentation timestamp.
+        self._reference_time = None
+        self._reference_timestamp = 0.
+        self._paused_time = None
+
+    def _now(self):
+        return self._paused_time if self._paused_time is not None else time.monotonic()
+
+    def reset(self, target_fps):
+        with self.lock:
+            self._frame_interval = 1. / target_fps
+            self._reference_time = None
+            self._reference_timestamp = 0.
+            self._paused_time = None
+
+    def restart(self):
+        # The next started frame becomes the reference, used after seeking.
+        with self.lock:
+            self._reference_time = None
+            self._reference_timestamp = 0.
+
+    def start(self, timestamp):
+        with self.lock:
+            self._reference_time = time.monotonic()
+            self._reference_timestamp = timestamp
+            self._paused_time = None
+
+    def pause(self):
+        with self.lock:
+            if self._paused_time is None:
+                self._paused_time = time.monotonic()
+
+    def resume(self):
+        with self.lock:
+            if self._paused_time is None:
+                return
+            if self._reference_time is not None:
+                self._reference_time += time.monotonic() - self._paused_time
+            self._paused_time = None
+
+    def get_due_time(self, timestamp):
+        with self.lock:
+            return self._reference_time + (timestamp - self._reference_timestamp)
+
+    def get_lag(self, timestamp):
+        # Positive when the frame is already late, 0 until the clock is started.
+        with self.lock:
+            if self._reference_time is None:
+                return 0.
+            due_time = self._reference_time + (timestamp - self._reference_timestamp)
+            return self._now() - due_time
+
+    @property
+    def is_started(self):
+        return self._reference_time is not None
+
+    @property
+    def frame_interval(self):
+        return self._frame_interval
@@ -1,12 +1,58 @@
+import queue
+import threading
 import time
 
-from service.render.AsciiFrameConverterUtil import AsciiFrameConverterUtil
+from cachetools import LRUCache
+
+from service.render.AsciiFrameConverterUtil import AsciiFrameConverterUtil, ColorDepth
+from service.render.FrameConversionThread import FrameConversionThread
+from service.render.ParallelFrameConversionThread import ParallelFrameConversionThread
+from service.render.PlaybackClock import PlaybackClock
+
+
+class FrameDisplayThread(threading.Thread):
+    def __init__(self, display_queue, display_frame_callback):
+        super().__init__()
+
+        self.stop_event = threading.Event()
+
+        self._display_queue = display_queue
+        self._display_frame_callback = display_frame_callback
+
+    def run(self):
+        while not self.stop_event.is_set():
+            item = self._display_queue.get()
+            if item is None:
+                continue
+
+            self._display_frame_callback(*item)
+
+    def stop(self):
+        self.stop_event.set()
+        self._display_queue.put(None)
 
 
 class VideoRenderingManager:
-    def __init__(self, char_aspect_ratio, should_use_colors, should_render_high_accuracy, should_invert_colors):
-        self._ascii_frame_converter_util = AsciiFrameConverterUtil(char_aspect_ratio, should_use_colors,
-                                                                   should_render_high_accuracy, should_invert_colors)
+    # Decoded frames waiting for conversion, and converted frames waiting for their display time.
+    _FRAME_QUEUE_SIZE = 4
+    _DISPLAY_QUEUE_SIZE = 8
+
+    # Frames later than this many frame intervals are dropped instead of being displayed.
+    _MAX_FRAME_LAG_INTERVALS = 2
+
+    # Total chars of rendered thumbnails kept around for browsing back and forth.
+    _THUMBNAIL_CACHE_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, char_aspect_ratio, should_use_colors, should_render_high_accuracy, should_invert_colors,
+                 should_use_legacy_conversion=False, color_depth=ColorDepth.ANSI_8, workers=1):
+        converter_args = (char_aspect_ratio, should_use_colors, should_render_high_accuracy, should_invert_colors,
+                          should_use_legacy_conversion, color_depth)
+        self._ascii_frame_converter_util = AsciiFrameConverterUtil(*converter_args)
+
+        # Rendered thumbnails by video and geometry, the converter settings being fixed for the manager's lifetime.
+        self._thumbnail_cache_lock = threading.Lock()
+        self._thumbnail_cache = LRUCache(maxsize=self._THUMBNAIL_CACHE_SIZE,
+                                         getsizeof=lambda rendered_thumbnail: len(rendered_thumbnail['content']))
 
         self._display_callback = None
         self._subtitles_callback = None
@@ -14,53 +60,103 @@ class VideoRenderingManager:
         self._cli_cols = 0
         self._cli_rows = 0
 
-        self._last_render_time = None
-        self._render_interval = None
+        self._playback_clock = PlaybackClock()
+
+        self._rendered_frames = 0
+        self._dropped_frames = 0
+        self._lag = 0.
+        self._should_show_playback_stats = False
+
+        # Seconds from the video being requested to each step of opening it being done.
+        self._open_start_time = None
+        self._open_timings = dict()
 
         self._scaling_factor = None
         self._max_frame_width = None
 
-        self._total_frames = None
+        self._video_duration = None
         self._video_title = None
         self._video_view_count = None
         self._video_creator = None
         self._rating = 'none'
 
         self._is_video_playing = False
+        self._playing_state_condition = threading.Condition()
 
-    def init_state(self, state_data):
-        self._display_callback = state_data['display_callback']
-        self._subtitles_callback = state_data['subtitles_callback']
+        # Frames from a previously opened video still in the pipeline are discarded by comparing sessions.
+        self._session_id = 0
+        self._last_displayed_frame = None
 
-        target_fps = state_data['target_fps']
+        self._frame_queue = queue.Queue(maxsize=self._FRAME_QUEUE_SIZE)
+        self._display_queue = queue.Queue(maxsize=self._DISPLAY_QUEUE_SIZE)
 
-        self._render_interval = 1. / target_fps
-        self._last_render_time = time.time() - self._render_interval
+        if workers > 1:
+            self._frame_conversion_thread = ParallelFrameConversionThread(self._frame_queue, self._display_queue,
+                                                                          converter_args, workers,
+                                                                          self._get_conversion_params,
+                                                                          self._convert_frame, self.should_drop_frame)
+        else:
+            self._frame_conversion_thread = FrameConversionThread(self._frame_queue, self._display_queue,
+                                                                  self._convert_frame, self.should_drop_frame)
+        self._frame_conversion_thread.daemon = True
+        self._frame_conversion_thread.start()
 
-        self._scaling_factor = state_data['scaling_factor']
-        self._max_frame_width = state_data['max_frame_width']
+        self._frame_display_thread = FrameDisplayThread(self._display_queue, self._display_frame)
+        self._frame_display_thread.daemon = True
+        self._frame_display_thread.start()
 
-        self._total_frames = state_data['total_frames']
-        self._video_title = state_data['video_title']
-        self._video_view_count = state_data['video_view_count']
-        self._video_creator = state_data['video_creator']
-        self._rating = state_data['rating']
+    def _clear_queues(self):
+        for pipeline_queue in [self._frame_queue, self._display_queue]:
+            try:
+                while True:
+                    pipeline_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+    def _get_conversion_params(self):
+        return self._cli_cols, self._scaling_factor, self._max_frame_width
+
+    def _convert_frame(self, frame):
+        return self._ascii_frame_converter_util.convert_frame_to_ascii(frame, *self._get_conversion_params())
+
+    def _is_frame_late(self, timestamp):
+        return (self._playback_clock.get_lag(timestamp)
+                > self._playback_clock.frame_interval * self._MAX_FRAME_LAG_INTERVALS)
 
-    def render_frame(self, frame, frame_count):
-        current_time = time.time()
-        elapsed_time = current_time - self._last_render_time
-        time_delta = self._render_interval - elapsed_time
+    def _display_frame(self, session_id, display_frame_data, timestamp):
+        with self._playing_state_condition:
+            while not self._is_video_playing and session_id == self._session_id:
+                self._playing_state_condition.wait()
 
+        if session_id != self._session_id:
+            return
+
+        if not self._playback_clock.is_started:
+            self._playback_clock.start(timestamp)
+
+        # A late frame is only skipped if a newer one is ready, so slow conversion still shows something.
+        if self._is_frame_late(timestamp) and not self._display_queue.empty():
+            self._dropped_frames += 1
+            return
+
+        time_delta = self._playback_clock.get_due_time(timestamp) - time.monotonic()
         if time_delta > 0:
             time.sleep(time_delta)
-        self._last_render_time = time.time()
 
-        display_frame_data = self._ascii_frame_converter_util.convert_frame_to_ascii(
-            frame, self._cli_cols, self._scaling_factor, self._max_frame_width)
+        self._rendered_frames += 1
+        self._lag = max(0., self._playback_clock.get_lag(timestamp))
+
+        self._last_displayed_frame = (display_frame_data, timestamp)
+        self._show_frame(display_frame_data, timestamp)
 
-        percent_watched = frame_count / self._total_frames
+        if self._open_start_time is not None and 'first_frame' not in self._open_timings:
+            self._open_timings['first_frame'] = time.monotonic() - self._open_start_time
 
-        subtitles = self._subtitles_callback(percent_watched)
+    def _show_frame(self, display_frame_data, timestamp):
+        # Live streams have no duration.
+        percent_watched = timestamp / self._video_duration if self._video_duration else 0.
+
+        subtitles = self._subtitles_callback(timestamp)
 
         args = {
             'screen_width': display_frame_data['width'],
@@ -78,18 +174,128 @@ class VideoRenderingManager:
                 'subtitles': subtitles
             }
 
+        if self._should_show_playback_stats:
+            args |= {
+                'playback_stats': self.playback_stats
+            }
+
         self._display_callback(args)
 
+    def init_state(self, state_data):
+        with self._playing_state_condition:
+            self._session_id += 1
+            self._last_displayed_frame = None
+            self._clear_queues()
+            self._playing_state_condition.notify_all()
+
+        self._display_callback = state_data['display_callback']
+        self._subtitles_callback = state_data['subtitles_callback']
+
+        self._playback_clock.reset(state_data['target_fps'])
+
+        self._rendered_frames = 0
+        self._dropped_frames = 0
+        self._lag = 0.
+        self._should_show_playback_stats = state_data.get('should_show_playback_stats', False)
+
+        self._open_start_time = state_data.get('open_start_time')
+        self._open_timings = dict(state_data.get('open_timings', {}))
+
+        self._scaling_factor = state_data['scaling_factor']
+        self._max_frame_width = state_data['max_frame_width']
+
+        self._video_duration = state_data['video_duration']
+        self._video_title = state_data['video_title']
+        self._video_view_count = state_data['video_view_count']
+        self._video_creator = state_data['video_creator']
+        self._rating = state_data['rating']
+
+    def should_drop_frame(self, timestamp):
+        # Lets earlier stages skip frames that would be late anyway, before decoding or converting them.
+        if not self._is_frame_late(timestamp):
+            return False
+
+        self._dropped_frames += 1
+        return True
+
+    def on_seek(self, timestamp, session_id):
+        # A seek in a video which has since been replaced changes nothing, its frames are discarded anyway.
+        with self._playing_state_condition:
+            if session_id != self._session_id:
+                return None
+
+            # Frames decoded before the seek are stale, and pacing restarts from the first frame after it.
+            self._session_id += 1
+            self._clear_queues()
+            self._playback_clock.restart()
+            self._playing_state_condition.notify_all()
+            return self._session_id
+
+    def render_frame(self, frame, timestamp, session_id):
+        # Frames carry the session of the capture they were decoded from, which the caller got from session_id when
+        # opening it. Blocks while the pipeline is full, which in turn throttles decoding.
+        self._frame_queue.put((session_id, frame, timestamp))
+
+    def render_thumbnail(self, thumbnail_id, thumbnail, cols, scaling_factor, max_frame_width):
+        cache_key = (thumbnail_id, cols, scaling_factor, max_frame_width)
+        with self._thumbnail_cache_lock:
+            rendered_thumbnail = self._thumbnail_cache.get(cache_key)
+        if rendered_thumbnail is not None:
+            return rendered_thumbnail
+
+        rendered_thumbnail = self._ascii_frame_converter_util.convert_frame_to_ascii(thumbnail, cols, scaling_factor,
+                                                                                    max_frame_width)
+        with self._thumbnail_cache_lock:
+            self._thumbnail_cache[cache_key] = rendered_thumbnail
+        return rendered_thumbnail
+
     def update_cli_dimensions(self, cols, rows):
         self._cli_cols = cols
         self._cli_rows = rows
 
     def set_video_playing_state(self, is_playing):
-        self._is_video_playing = is_playing
+        with self._playing_state_condition:
+            self._is_video_playing = is_playing
+            if is_playing:
+                self._playback_clock.resume()
+            else:
+                self._playback_clock.pause()
+            self._playing_state_condition.notify_all()
+
+        # Redraw the last frame, so the status bar reflects the paused state.
+        if not is_playing and self._last_displayed_frame is not None:
+            self._show_frame(*self._last_displayed_frame)
 
     def update_video_rating(self, rating):
         self._rating = rating
 
+    def update_open_timing(self, step, seconds):
+        self._open_timings[step] = seconds
+
+    @property
+    def session_id(self):
+        return self._session_id
+
+    @property
+    def current_timestamp(self):
+        if self._last_displayed_frame is None:
+            return 0.
+        return self._last_displayed_frame[1]
+
+    @property
+    def playback_stats(self):
+        return {
+            'rendered_frames': self._rendered_frames,
+            'dropped_frames': self._dropped_frames,
+            'lag': self._lag,
+            'open_timings': dict(self._open_timings)
+        }
+
     @property
     def ascii_converter(self):
         return self._ascii_frame_converter_util
+
+    @property
+    def max_held_frames(self):
+        # Decoded frames waiting for conversion, plus the one being converted.
+        return self._FRAME_QUEUE_SIZE + 1
@@ -1 +1,2 @@
+from .AsciiFrameConverterUtil import ColorDepth
 from .VideoRenderingManager import VideoRenderingManager
@@ -0,0 +1,43 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+
+class SubtitleCueIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self._starts = list()
+        self._ends = list()
+        self._contents = list()
+
+        # Latest end among the cues up to each one, non-decreasing so it can be bisected even with overlaps.
+        self._max_ends = list()
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add_cue(self, start, end, content):
+        with self.lock:
+            # Cues come in start order, anything else is inserted in place.
+            index = len(self._starts)
+            if index > 0 and start < self._starts[-1]:
+                index = bisect_right(self._starts, start)
+
+            self._starts.insert(index, start)
+            self._ends.insert(index, end)
+            self._contents.insert(index, content)
+            self._max_ends.insert(index, end)
+
+            for max_end_index in range(index, len(self._max_ends)):
+                previous_max_end = self._max_ends[max_end_index - 1] if max_end_index > 0 else float('-inf')
+                self._max_ends[max_end_index] = max(previous_max_end, self._ends[max_end_index])
+
+    def get_active_cues(self, timestamp):
+        with self.lock:
+            # Cues past the last one started are not active yet, and cues before the first one whose running max end
+            # reaches the timestamp have all ended, which leaves only the few in between to check.
+            last_started = bisect_right(self._starts, timestamp)
+            first_not_ended = bisect_left(self._max_ends, timestamp, 0, last_started)
+
+            return [self._contents[index] for index in range(first_not_ended, last_started)
+                    if self._ends[index] >= timestamp]
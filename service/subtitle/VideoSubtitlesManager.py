@@ -1,65 +1,211 @@
-from datetime import datetime
-from io import StringIO
+import html
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-import webvtt
+from cachetools import LRUCache
+
+from service.cache import DiskCache
+from service.subtitle.SubtitleCueIndex import SubtitleCueIndex
 
 
 class VideoSubtitlesManager:
+    _max_prefetch_workers = 2
+    _max_cached_subtitles = 16
+
+    _subtitles_request_timeout = 10
+
+    _cache_dir = './data/subtitles_cache'
+    _max_cache_size_bytes = 16 * 1024 * 1024
+    # Bumped whenever parsing changes, so tracks cached by an older parser are parsed again.
+    _cache_format_version = 2
+
+    _timing_separator = '-->'
+    _non_cue_blocks = ('NOTE', 'STYLE', 'REGION')
+    _cue_tags_pattern = re.compile(r'<[^>]*>')
+
     def __init__(self):
-        self._src = list()
-        self._index = 0
-        self._video_duration = 0
+        self._cue_index = SubtitleCueIndex()
+
+        # Cue indexes by subtitles url with their downloads, started ahead of time for videos likely to be opened next.
+        self._lock = threading.Lock()
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=self._max_prefetch_workers)
+        self._prefetched_subtitles = LRUCache(maxsize=self._max_cached_subtitles)
+
+        # Parsed cues by video, language and kind, as subtitle urls expire along with the video metadata.
+        self._subtitles_cache = DiskCache(self._cache_dir, self._max_cache_size_bytes)
 
     def _parse_timestamp_str(self, timestamp_str):
+        # HH:MM:SS.mmm, with the hours being optional.
+        parts = timestamp_str.split(':')
+        if len(parts) not in [2, 3]:
+            return None
+
         try:
-            dt = datetime.strptime(timestamp_str, '%H:%M:%S.%f')
-            seconds = (dt.hour * 3600) + (dt.minute * 60) + dt.second + (dt.microsecond / 1000000)
-            return seconds
+            hours = int(parts[0]) if len(parts) == 3 else 0
+            minutes = int(parts[-2])
+            seconds = float(parts[-1])
         except ValueError:
             return None
 
-    def set_subtitles_resource(self, subtitles_info, video_duration):
-        self._video_duration = video_duration
-        self._src.clear()
-        self._index = 0
+        return hours * 3600 + minutes * 60 + seconds
+
+    def _parse_timing_line(self, line):
+        start_str, end_str = line.split(self._timing_separator, 1)
+        end_str = end_str.split()
+        if len(end_str) == 0:
+            return None, None
+
+        # Cue settings may follow the end timestamp.
+        return self._parse_timestamp_str(start_str.strip()), self._parse_timestamp_str(end_str[0])
+
+    def _clean_cue_line(self, line):
+        return html.unescape(self._cue_tags_pattern.sub('', line)).replace('\t', ' ' * 4).strip()
+
+    def _parse_cues(self, lines):
+        # Yields (start, end, lines) for each cue, as soon as its block ends.
+        is_header = True
+        is_skipped_block = False
+        start = end = None
+        cue_lines = list()
+
+        for line in lines:
+            # Only an empty line ends a block, auto-captions open cues with a whitespace only line.
+            if line == '':
+                if start is not None and end is not None:
+                    yield start, end, cue_lines
+                is_header = False
+                is_skipped_block = False
+                start = end = None
+                cue_lines = list()
+                continue
 
-        if subtitles_info is None:
-            return
+            if is_header or is_skipped_block:
+                continue
 
-        url = subtitles_info['url']
-        response = requests.get(url)
-        if not response.ok:
+            if start is None and end is None:
+                if self._timing_separator in line:
+                    start, end = self._parse_timing_line(line)
+                    is_skipped_block = start is None or end is None
+                elif line.startswith(self._non_cue_blocks):
+                    is_skipped_block = True
+                # Otherwise the line is an optional cue identifier.
+                continue
+
+            cue_lines.append(self._clean_cue_line(line))
+
+        if start is not None and end is not None:
+            yield start, end, cue_lines
+
+    def _get_cache_key(self, subtitles_info):
+        # Metadata cached before these fields existed only identifies its subtitles by url.
+        if 'video_id' not in subtitles_info or 'lang' not in subtitles_info:
+            return None
+
+        kind = 'auto' if subtitles_info.get('is_automatic', False) else 'manual'
+        return f"{self._cache_format_version}:{subtitles_info['video_id']}:{subtitles_info['lang']}:{kind}"
+
+    def _load_cached_subtitles(self, cache_key, cue_index):
+        data = self._subtitles_cache.get(cache_key)
+        if data is None:
+            return False
+
+        try:
+            cues = json.loads(data)
+        except ValueError:
+            self._subtitles_cache.remove(cache_key)
+            return False
+
+        for start, end, content in cues:
+            cue_index.add_cue(start, end, content)
+        return True
+
+    def _load_subtitles(self, subtitles_info, cue_index):
+        cache_key = self._get_cache_key(subtitles_info)
+        if cache_key is not None and self._load_cached_subtitles(cache_key, cue_index):
             return
 
-        buffer = StringIO(response.text)
+        cues = self._stream_subtitles(subtitles_info['url'], cue_index, subtitles_info.get('is_automatic', False))
 
-        for caption in webvtt.read_buffer(buffer):
-            start = self._parse_timestamp_str(caption.start)
-            end = self._parse_timestamp_str(caption.end)
+        # Only complete tracks are cached, a failed download raises before getting here.
+        if cache_key is not None:
+            self._subtitles_cache.put(cache_key, json.dumps(cues, separators=(',', ':')).encode())
 
-            if start is None or end is None:
-                continue
+    def _stream_subtitles(self, url, cue_index, is_automatic):
+        cues = list()
 
-            self._src.append({
-                'start': start,
-                'end': end,
-                'content': caption.text.replace('\t', ' ' * 4)
-            })
+        with requests.get(url, stream=True, timeout=self._subtitles_request_timeout) as response:
+            # Raised, so the failed download is dropped and retried the next time the video is opened.
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
 
-    def current_subtitle(self, progress):
-        timestamp = progress * self._video_duration
+            previous_lines = list()
+            for start, end, lines in self._parse_cues(response.iter_lines(decode_unicode=True)):
+                lines = [line for line in lines if line != '']
 
-        if self._index >= len(self._src):
-            return ''
+                # Rolling auto-captions repeat the previous cue's lines above the new ones, and briefly show them on
+                # their own in between, so only lines which are actually new are kept.
+                if is_automatic:
+                    new_lines = [line for line in lines if line not in previous_lines]
+                    previous_lines = lines
+                    lines = new_lines
 
-        if self._src[self._index]['end'] < timestamp:
-            self._index += 1
+                if len(lines) > 0:
+                    cues.append((start, end, '\n'.join(lines)))
+                    cue_index.add_cue(*cues[-1])
 
-        if self._index >= len(self._src):
-            return ''
+        return cues
+
+    def _on_subtitles_loaded(self, url, future):
+        # A failed download is not kept, so opening the video again retries it.
+        if future.exception() is None:
+            return
+        with self._lock:
+            prefetched_subtitles = self._prefetched_subtitles.get(url)
+            if prefetched_subtitles is not None and prefetched_subtitles[1] is future:
+                del self._prefetched_subtitles[url]
 
-        if self._src[self._index]['start'] > timestamp:
-            return ''
+    def _get_subtitles(self, subtitles_info):
+        url = subtitles_info['url']
+        with self._lock:
+            prefetched_subtitles = self._prefetched_subtitles.get(url)
+            if prefetched_subtitles is not None:
+                return prefetched_subtitles
+
+            cue_index = SubtitleCueIndex()
+            future = self._prefetch_executor.submit(self._load_subtitles, subtitles_info, cue_index)
+            self._prefetched_subtitles[url] = (cue_index, future)
+
+        # Added outside the lock, as the callback runs right away if the download already failed.
+        future.add_done_callback(lambda done_future: self._on_subtitles_loaded(url, done_future))
+        return cue_index, future
+
+    def prefetch_subtitles_resource(self, subtitles_info):
+        if subtitles_info is None:
+            return
+        self._get_subtitles(subtitles_info)
+
+    def set_subtitles_resource(self, subtitles_info):
+        # Returns right away, cues show up as they are parsed while the rest of the file is still downloading.
+        if subtitles_info is None:
+            self._cue_index = SubtitleCueIndex()
+        else:
+            self._cue_index = self._get_subtitles(subtitles_info)[0]
+
+    def add_subtitles_loaded_callback(self, subtitles_info, callback):
+        # Called right away if there is no download to wait for, otherwise from the thread which ran it.
+        prefetched_subtitles = None
+        if subtitles_info is not None:
+            with self._lock:
+                prefetched_subtitles = self._prefetched_subtitles.get(subtitles_info['url'])
+
+        if prefetched_subtitles is None:
+            callback()
+            return
+        prefetched_subtitles[1].add_done_callback(lambda _: callback())
 
-        return self._src[self._index]['content']
+    def current_subtitle(self, timestamp):
+        # Looked up from scratch every time, so pauses, dropped frames and seeks in either direction need no care.
+        return '\n'.join(self._cue_index.get_active_cues(timestamp))
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+from cachetools import LRUCache
+
+from service.cache import DiskCache
+
+
+class VideoMetadataCache:
+    _cache_dir = './data/metadata_cache'
+    _max_disk_size_bytes = 32 * 1024 * 1024
+    _max_memory_entries = 64
+
+    # Used when stream URLs carry no expiry of their own.
+    _default_ttl_seconds = 4 * 3600
+    # Entries are considered expired this early, so playback never starts on a URL about to stop working.
+    _expiry_margin_seconds = 15 * 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self._memory_cache = LRUCache(maxsize=self._max_memory_entries)
+        self._disk_cache = DiskCache(self._cache_dir, self._max_disk_size_bytes)
+
+    def _get_expiry_time(self, video_info):
+        urls = [stream_format['url'] for stream_format in video_info['stream_formats']]
+        urls.append(video_info['fallback_stream']['url'])
+        if video_info['subtitles'] is not None:
+            urls.append(video_info['subtitles']['url'])
+
+        expiry_times = list()
+        for url in urls:
+            expire = parse_qs(urlparse(url).query).get('expire')
+            if expire is not None and expire[0].isdigit():
+                expiry_times.append(int(expire[0]))
+
+        if len(expiry_times) == 0:
+            return time.time() + self._default_ttl_seconds
+        return min(expiry_times)
+
+    def _is_valid(self, entry):
+        return entry['expires_at'] - self._expiry_margin_seconds > time.time()
+
+    def get(self, key):
+        with self.lock:
+            entry = self._memory_cache.get(key)
+
+        if entry is None:
+            data = self._disk_cache.get(key)
+            if data is None:
+                return None
+
+            try:
+                entry = json.loads(data)
+            except ValueError:
+                self._disk_cache.remove(key)
+                return None
+
+            with self.lock:
+                self._memory_cache[key] = entry
+
+        if not self._is_valid(entry):
+            self.remove(key)
+            return None
+
+        return entry['video_info']
+
+    def put(self, key, video_info):
+        entry = {
+            'expires_at': self._get_expiry_time(video_info),
+            'video_info': video_info
+        }
+
+        with self.lock:
+            self._memory_cache[key] = entry
+        self._disk_cache.put(key, json.dumps(entry).encode())
+
+    def remove(self, key):
+        with self.lock:
+            self._memory_cache.pop(key, None)
+        self._disk_cache.remove(key)
@@ -1,58 +1,188 @@
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
 
 import cv2
 import yt_dlp
 
+from service.video.VideoMetadataCache import VideoMetadataCache
 from util import get_abbreviated_view_count
 
 
 class VideoStreamHandlerThread(threading.Thread):
-    def __init__(self, ):
+    _default_frame_interval = 1. / 30
+
+    def __init__(self, held_frame_count=0):
         super().__init__()
 
         self.stop_event = threading.Event()
         self.lock = threading.Lock()
+        self.state_changed = threading.Condition(self.lock)
 
         self._stream_url = None
         self._frame_callback = None
+        self._should_drop_frame_callback = None
+        self._seek_callback = None
         self._cv2_capture = None
-        self._frame = None
-        self._frame_count = 0
 
-        self._is_playing = False
+        # Rendering session frames of the open capture belong to, so the pipeline can tell them from another video's.
+        self._session_id = None
+
+        # Frames are decoded into a ring of buffers instead of newly allocated arrays. Frames handed to the callback
+        # may still be held downstream, so the ring also covers the frame being decoded and one spare.
+        self._frame_buffers = [None] * (held_frame_count + 2)
+        self._frame_buffer_index = 0
+
+        # Presentation time of the last frame read, in seconds, unknown right after opening or seeking.
+        self._position = None
+        self._frame_interval = None
 
-    def set_video_player(self, stream_url, frame_callback):
-        self._stream_url = stream_url
-        self._frame_callback = frame_callback
+        # Video requested by set_video_player, opened by the thread itself so that only it touches captures.
+        self._pending_video_player = None
+        self._pending_seek_ms = None
 
-        self._cv2_capture = cv2.VideoCapture(self._stream_url)
-        self._frame_count = 0
-        self._is_playing = True
+        self._is_playing = False
+        # Set once the stream runs out of frames, the capture is kept open so seeking back still works.
+        self._is_stream_ended = False
+
+    def set_video_player(self, stream_url, session_id, frame_callback, should_drop_frame_callback=None,
+                         seek_callback=None, start_position_ms=None):
+        with self.state_changed:
+            self._pending_video_player = (stream_url, session_id, frame_callback, should_drop_frame_callback,
+                                          seek_callback)
+            self._pending_seek_ms = start_position_ms
+            self._is_playing = True
+            self.state_changed.notify_all()
+
+    def seek(self, position_ms):
+        with self.state_changed:
+            self._pending_seek_ms = position_ms
+            self.state_changed.notify_all()
+
+    def _release_capture(self):
+        if self._cv2_capture is not None:
+            self._cv2_capture.release()
+        self._cv2_capture = None
+
+    def _open_pending_video_player(self):
+        with self.state_changed:
+            pending_video_player = self._pending_video_player
+            self._pending_video_player = None
+
+        # The previous video's decoder is released before the next one is opened, never leaking its handles.
+        self._release_capture()
+
+        stream_url, session_id, frame_callback, should_drop_frame_callback, seek_callback = pending_video_player
+        cv2_capture = cv2.VideoCapture(stream_url)
+
+        with self.state_changed:
+            # Another video may have been requested while this one was opening.
+            if self._pending_video_player is not None:
+                cv2_capture.release()
+                return
+
+            self._stream_url = stream_url
+            self._session_id = session_id
+            self._frame_callback = frame_callback
+            self._should_drop_frame_callback = should_drop_frame_callback
+            self._seek_callback = seek_callback
+
+            self._cv2_capture = cv2_capture
+            self._position = None
+            self._is_stream_ended = False
+
+            # Only used to estimate timestamps the stream itself does not provide.
+            fps = cv2_capture.get(cv2.CAP_PROP_FPS)
+            self._frame_interval = 1. / fps if fps > 0 else self._default_frame_interval
+
+    def _apply_pending_seek(self):
+        with self.state_changed:
+            position_ms = self._pending_seek_ms
+            self._pending_seek_ms = None
+
+        if self._cv2_capture is None:
+            return
+
+        # The FFmpeg backend jumps to the closest preceding keyframe and decodes up to the target internally,
+        # so none of the skipped frames reach the rendering pipeline.
+        # The reported position only reflects the seek once the next frame is read.
+        self._cv2_capture.set(cv2.CAP_PROP_POS_MSEC, position_ms)
+        self._position = None
+        self._is_stream_ended = False
+
+        # Seeking starts a new session, unless another video's has already replaced this one.
+        if self._seek_callback is not None:
+            session_id = self._seek_callback(position_ms / 1000, self._session_id)
+            if session_id is not None:
+                self._session_id = session_id
+
+    def _wait_for_playback(self):
+        # Sleeps until there is something to do, instead of spinning while paused or idle.
+        with self.state_changed:
+            while (not self.stop_event.is_set() and self._pending_video_player is None
+                   and self._pending_seek_ms is None
+                   and (not self._is_playing or self._cv2_capture is None or self._is_stream_ended)):
+                self.state_changed.wait()
+
+    def _update_position(self):
+        position = self._cv2_capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+        # Streams without usable timestamps are timed from their nominal frame rate instead.
+        if self._position is not None and position <= self._position:
+            position = self._position + self._frame_interval
+        self._position = position
+
+    def _read_next_frame(self):
+        # Late frames are only grabbed, which skips retrieving and converting them.
+        if (self._should_drop_frame_callback is not None and self._position is not None
+                and self._should_drop_frame_callback(self._position + self._frame_interval)):
+            if not self._cv2_capture.grab():
+                return False
+            self._update_position()
+            return True
+
+        # OpenCV allocates a new array instead whenever the buffer does not match the frame size, which is kept.
+        _, frame = self._cv2_capture.read(image=self._frame_buffers[self._frame_buffer_index])
+        if frame is None:
+            return False
+        self._frame_buffers[self._frame_buffer_index] = frame
+        self._frame_buffer_index = (self._frame_buffer_index + 1) % len(self._frame_buffers)
+
+        self._update_position()
+        self._frame_callback(frame, self._position, self._session_id)
+        return True
 
     def run(self):
         while not self.stop_event.is_set():
-            if not self._is_playing or self._cv2_capture is None:
+            self._wait_for_playback()
+            if self.stop_event.is_set():
+                break
+
+            if self._pending_video_player is not None:
+                self._open_pending_video_player()
                 continue
 
-            _, self._frame = self._cv2_capture.read()
-            if self._frame is None:
-                break
+            if self._pending_seek_ms is not None:
+                self._apply_pending_seek()
+                continue
 
-            self._frame_count += 1
-            self._frame_callback(self._frame, self._frame_count)
+            # The thread outlives the stream, waiting for a seek or the next video once this one ends.
+            if not self._read_next_frame():
+                with self.state_changed:
+                    self._is_stream_ended = True
 
-        self._cv2_capture.release()
+        self._release_capture()
         self._is_playing = False
 
     def stop(self):
-        self.stop_event.set()
+        with self.state_changed:
+            self.stop_event.set()
+            self.state_changed.notify_all()
 
     def update_video_state(self, is_playing):
-        with self.lock:
+        with self.state_changed:
             self._is_playing = is_playing
-
-            if not self._is_playing and self._frame_callback is not None:
-                self._frame_callback(self._frame, self._frame_count)
+            self.state_changed.notify_all()
 
 
 class VideoStreamManager:
@@ -77,14 +207,75 @@ class VideoStreamManager:
         'format': 'worst'
     }
 
-    def __init__(self):
-        self._video_stream_handler_thread = VideoStreamHandlerThread()
+    # Codecs the bundled OpenCV FFmpeg build may fail to decode, only picked if nothing else fits.
+    _unpreferred_vcodec_prefixes = ('av01',)
+
+    _max_prefetch_workers = 2
+
+    def __init__(self, held_frame_count=0):
+        self._metadata_cache = VideoMetadataCache()
+
+        # Extractions running or queued in the background, by metadata cache key. The lock is reentrant, as done
+        # callbacks of futures which already finished run right away in the thread adding them.
+        self._prefetch_lock = threading.RLock()
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=self._max_prefetch_workers)
+        self._prefetched_video_info = dict()
+
+        self._video_stream_handler_thread = VideoStreamHandlerThread(held_frame_count)
         self._video_stream_handler_thread.daemon = True
         self._video_stream_handler_thread.start()
 
         self._is_playing = False
 
-    def get_video_metadata(self, video_url, should_use_subtitles, subtitles_lang):
+    def _get_stream_formats(self, video_info):
+        stream_formats = list()
+        for video_format in video_info.get('formats', []):
+            if video_format.get('vcodec') in [None, 'none'] or not video_format.get('width') \
+                    or not video_format.get('url'):
+                continue
+
+            stream_formats.append({
+                'url': video_format['url'],
+                'width': video_format['width'],
+                'fps': video_format.get('fps'),
+                'tbr': video_format.get('tbr') or 0,
+                'vcodec': video_format['vcodec'],
+                'is_video_only': video_format.get('acodec') == 'none'
+            })
+        return stream_formats
+
+    def select_stream_format(self, stream_formats, min_stream_width, fps=None):
+        # Smallest video-only stream at least as wide as needed, frames are bound by the terminal size anyway.
+        # Streams without a known fps cannot be paced, so they are never picked.
+        candidates = [stream_format for stream_format in stream_formats
+                      if stream_format['fps'] and (fps is None or stream_format['fps'] == fps)]
+        if len(candidates) == 0:
+            return None
+
+        def sort_key(stream_format):
+            is_unpreferred = stream_format['vcodec'].startswith(self._unpreferred_vcodec_prefixes)
+            return (is_unpreferred, not stream_format['is_video_only'], stream_format['width'],
+                    stream_format['fps'], stream_format['tbr'])
+
+        wide_enough = [stream_format for stream_format in candidates if stream_format['width'] >= min_stream_width]
+        if len(wide_enough) > 0:
+            return min(wide_enough, key=sort_key)
+
+        # Nothing is wide enough, so the widest stream available is the closest match.
+        widest_width = max(stream_format['width'] for stream_format in candidates)
+        return min([stream_format for stream_format in candidates if stream_format['width'] == widest_width],
+                   key=sort_key)
+
+    def _get_video_id(self, video_url):
+        parsed_url = urlparse(video_url)
+        if parsed_url.netloc.endswith('youtu.be'):
+            return parsed_url.path.lstrip('/') or None
+        return parse_qs(parsed_url.query).get('v', [None])[0]
+
+    def _get_metadata_cache_key(self, video_id, should_use_subtitles, subtitles_lang):
+        return f'{video_id}:{subtitles_lang if should_use_subtitles else ""}'
+
+    def _extract_video_info(self, video_url, should_use_subtitles, subtitles_lang):
         subtitles_options = dict()
         if should_use_subtitles:
             subtitles_options |= {
@@ -96,6 +287,7 @@ class VideoStreamManager:
         video_info = ytdl.extract_info(video_url, download=False)
 
         subtitles = None
+        is_automatic_subtitles = False
 
         if should_use_subtitles:
             if 'subtitles' in video_info:
@@ -110,24 +302,140 @@ class VideoStreamManager:
                     for subtitle in video_info.get('automatic_captions', {}).get(subtitles_lang, []):
                         if subtitle['ext'] == self._subtitles_format:
                             subtitles = subtitle
+                            is_automatic_subtitles = True
                             break
 
+        # Only the fields used afterwards are kept, the full extraction result is too large to cache.
         return {
             'id': video_info['id'],
             'thumbnail': video_info['thumbnail'],
-            'stream_url': video_info['url'],
-            'target_fps': video_info['fps'],
+            'stream_formats': self._get_stream_formats(video_info),
+            'fallback_stream': {
+                'url': video_info['url'],
+                'fps': video_info['fps']
+            },
             'title': video_info['title'],
             'duration': video_info['duration'],
             'is_live': video_info['is_live'],
             'creator': video_info['uploader'],
             'creator_id': video_info['channel_id'],
+            'view_count': video_info['view_count'],
+            'subtitles': None if subtitles is None else {
+                'url': subtitles['url'],
+                'ext': subtitles['ext'],
+                'video_id': video_info['id'],
+                'lang': subtitles_lang,
+                'is_automatic': is_automatic_subtitles
+            }
+        }
+
+    def _get_video_info(self, video_url, should_use_subtitles, subtitles_lang):
+        video_id = self._get_video_id(video_url)
+        cache_key = None if video_id is None else \
+            self._get_metadata_cache_key(video_id, should_use_subtitles, subtitles_lang)
+
+        if cache_key is not None:
+            video_info = self._metadata_cache.get(cache_key)
+            if video_info is not None:
+                return video_info
+
+            # Waiting on a prefetch already underway beats starting the same extraction a second time.
+            with self._prefetch_lock:
+                prefetch_future = self._prefetched_video_info.get(cache_key)
+            if prefetch_future is not None:
+                try:
+                    return prefetch_future.result()
+                except Exception:
+                    pass
+
+        video_info = self._extract_video_info(video_url, should_use_subtitles, subtitles_lang)
+
+        # Live streams are served from manifests which keep changing, so they are always extracted again.
+        if cache_key is not None and not video_info['is_live']:
+            self._metadata_cache.put(cache_key, video_info)
+
+        return video_info
+
+    def _prefetch_video_info(self, video_url, should_use_subtitles, subtitles_lang, on_prefetched_callback):
+        video_info = self._extract_video_info(video_url, should_use_subtitles, subtitles_lang)
+        if not video_info['is_live']:
+            self._metadata_cache.put(
+                self._get_metadata_cache_key(video_info['id'], should_use_subtitles, subtitles_lang), video_info)
+
+        if on_prefetched_callback is not None:
+            on_prefetched_callback(video_info)
+        return video_info
+
+    def _on_prefetch_done(self, cache_key, future):
+        with self._prefetch_lock:
+            if self._prefetched_video_info.get(cache_key) is future:
+                del self._prefetched_video_info[cache_key]
+
+    def prefetch_video_metadata(self, video_urls, should_use_subtitles, subtitles_lang, on_prefetched_callback=None):
+        cache_keys = dict()
+        for video_url in video_urls:
+            video_id = self._get_video_id(video_url)
+            if video_id is not None:
+                cache_keys[self._get_metadata_cache_key(video_id, should_use_subtitles, subtitles_lang)] = video_url
+
+        cached_video_infos = list()
+
+        with self._prefetch_lock:
+            # Queued extractions for videos no longer close to the selection are not worth waiting for.
+            for cache_key, future in list(self._prefetched_video_info.items()):
+                if cache_key not in cache_keys and future.cancel():
+                    del self._prefetched_video_info[cache_key]
+
+            for cache_key, video_url in cache_keys.items():
+                if cache_key in self._prefetched_video_info:
+                    continue
+
+                video_info = self._metadata_cache.get(cache_key)
+                if video_info is not None:
+                    cached_video_infos.append(video_info)
+                    continue
+
+                future = self._prefetch_executor.submit(self._prefetch_video_info, video_url, should_use_subtitles,
+                                                        subtitles_lang, on_prefetched_callback)
+                self._prefetched_video_info[cache_key] = future
+                future.add_done_callback(lambda done_future, key=cache_key: self._on_prefetch_done(key, done_future))
+
+        if on_prefetched_callback is not None:
+            for video_info in cached_video_infos:
+                on_prefetched_callback(video_info)
+
+    def get_video_metadata(self, video_url, should_use_subtitles, subtitles_lang, min_stream_width=0):
+        video_info = self._get_video_info(video_url, should_use_subtitles, subtitles_lang)
+
+        stream_formats = video_info['stream_formats']
+        stream_format = self.select_stream_format(stream_formats, min_stream_width)
+        if stream_format is None:
+            stream_format = video_info['fallback_stream']
+
+        return {
+            'id': video_info['id'],
+            'thumbnail': video_info['thumbnail'],
+            'stream_url': stream_format['url'],
+            'stream_formats': stream_formats,
+            'target_fps': stream_format['fps'],
+            'title': video_info['title'],
+            'duration': video_info['duration'],
+            'is_live': video_info['is_live'],
+            'creator': video_info['creator'],
+            'creator_id': video_info['creator_id'],
             'view_count': get_abbreviated_view_count(video_info['view_count']),
-            'subtitles': subtitles
+            'subtitles': video_info['subtitles']
         }
 
-    def parse_video_stream(self, stream_url, frame_callback):
-        self._video_stream_handler_thread.set_video_player(stream_url, frame_callback)
+    def parse_video_stream(self, stream_url, session_id, frame_callback, should_drop_frame_callback=None,
+                           seek_callback=None, start_position_seconds=0.):
+        start_position_ms = start_position_seconds * 1000 if start_position_seconds > 0 else None
+        self._video_stream_handler_thread.set_video_player(stream_url, session_id, frame_callback,
+                                                           should_drop_frame_callback, seek_callback,
+                                                           start_position_ms)
+
+    def seek(self, position_seconds):
+        self._video_stream_handler_thread.seek(max(0., position_seconds) * 1000)
 
     def set_video_state(self, is_playing):
         self._video_stream_handler_thread.update_video_state(is_playing)
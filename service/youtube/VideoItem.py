@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+
+class VideoItem:
+    # Browsing sessions keep every fetched result around, so items carry no per-instance dict.
+    __slots__ = ('title', 'creator', 'url', 'thumbnail_data', 'thumbnail')
+
+    def __init__(self, title, creator, url):
+        self.title = title
+        self.creator = creator
+        self.url = url
+
+        # Encoded JPEG, kept for the whole session at a fraction of the decoded size.
+        self.thumbnail_data = None
+        # Decoded on demand, and released once the item is far from the selection.
+        self.thumbnail = None
+
+    def decode_thumbnail(self):
+        if self.thumbnail is None and self.thumbnail_data is not None:
+            self.thumbnail = cv2.imdecode(np.frombuffer(self.thumbnail_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return self.thumbnail
+
+    def release_thumbnail(self):
+        self.thumbnail = None
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'creator': self.creator,
+            'thumbnail': self.thumbnail,
+            'url': self.url
+        }
@@ -1,9 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 import cv2
+import numpy as np
+import requests
 from google.auth.exceptions import RefreshError
 from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
 
+from service.cache import DiskCache
 from service.youtube.YoutubeCreatorPageState import YoutubeCreatorPageState
 from service.youtube.YoutubeHomeState import YoutubeHomeState
 from service.youtube.YoutubeSearchState import YoutubeSearchState
@@ -17,20 +22,59 @@ class YoutubeResultNav(Enum):
 
 
 class YoutubeConnectionManager:
+    _max_thumbnail_workers = 8
+    _thumbnail_request_timeout = 10
+
+    _thumbnail_cache_dir = './data/thumbnail_cache'
+    _max_thumbnail_cache_size_bytes = 64 * 1024 * 1024
+
     def __init__(self, credentials, on_request_fail):
         self._client = build("youtube", "v3", credentials=credentials)
         self._on_request_fail = on_request_fail
 
-        self._home_page_state = YoutubeHomeState(self._client, on_request_fail, self._get_thumbnail)
-        self._creator_page_state = YoutubeCreatorPageState(self._client, on_request_fail, self._get_thumbnail)
-        self._search_page_state = YoutubeSearchState(self._client, on_request_fail, self._get_thumbnail)
+        # Thumbnails are downloaded concurrently, over connections kept alive between requests.
+        self._thumbnail_executor = ThreadPoolExecutor(max_workers=self._max_thumbnail_workers)
+        self._thumbnail_session = requests.Session()
+        self._thumbnail_session.mount('https://', HTTPAdapter(pool_maxsize=self._max_thumbnail_workers))
+
+        # Encoded thumbnails by url, so results seen before are never downloaded again.
+        self._thumbnail_cache = DiskCache(self._thumbnail_cache_dir, self._max_thumbnail_cache_size_bytes)
+
+        self._home_page_state = YoutubeHomeState(self._client, on_request_fail, self._load_thumbnail)
+        self._creator_page_state = YoutubeCreatorPageState(self._client, on_request_fail, self._load_thumbnail)
+        self._search_page_state = YoutubeSearchState(self._client, on_request_fail, self._load_thumbnail)
+
+    def _download_thumbnail(self, url):
+        try:
+            response = self._thumbnail_session.get(url, timeout=self._thumbnail_request_timeout)
+        except requests.RequestException:
+            return None
+        if not response.ok:
+            return None
+        return response.content
+
+    def _get_thumbnail_data(self, url):
+        data = self._thumbnail_cache.get(url)
+        if data is not None:
+            return data
 
-    def _get_thumbnail(self, url):
-        cv2_capture = cv2.VideoCapture(url)
-        _, frame = cv2_capture.read()
-        if frame is None:
+        data = self._download_thumbnail(url)
+        if data is None:
             return None
-        return frame.copy()
+
+        # Only data known to decode is cached, anything else served in place of the image would stick around.
+        if cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) is None:
+            return None
+
+        self._thumbnail_cache.put(url, data)
+        return data
+
+    def _set_video_thumbnail_data(self, video_item, url):
+        video_item.thumbnail_data = self._get_thumbnail_data(url)
+        return video_item.thumbnail_data
+
+    def _load_thumbnail(self, video_item, url):
+        return self._thumbnail_executor.submit(self._set_video_thumbnail_data, video_item, url)
 
     def get_home_result(self, nav: YoutubeResultNav):
         if nav == YoutubeResultNav.FIRST:
@@ -66,6 +110,15 @@ class YoutubeConnectionManager:
 
         return self._search_page_state.current
 
+    def get_upcoming_home_results(self, count):
+        return self._home_page_state.get_upcoming(count)
+
+    def get_upcoming_creator_page_results(self, count):
+        return self._creator_page_state.get_upcoming(count)
+
+    def get_upcoming_search_results(self, count):
+        return self._search_page_state.get_upcoming(count)
+
     def _get_subscriptions_list(self):
         try:
             request = self._client.subscriptions().list(part='snippet', mine=True)
@@ -2,12 +2,14 @@ import threading
 
 from google.auth.exceptions import RefreshError
 
+from service.youtube.VideoItem import VideoItem
+
 
 class VideoFetchingThread(threading.Thread):
     def __init__(self,
                  add_video_callback,
                  update_page_token_callback,
-                 get_thumbnail_callback,
+                 load_thumbnail_callback,
                  on_request_fail_callback,
                  signal_fetch_done,
                  request_method,
@@ -23,10 +25,10 @@ class VideoFetchingThread(threading.Thread):
         self._request_params = request_params
         self._on_request_fail_callback = on_request_fail_callback
         self._video_id_json_path = video_id_json_path
-        self._get_thumbnail_callback = get_thumbnail_callback
+        self._load_thumbnail_callback = load_thumbnail_callback
         self._signal_fetch_done = signal_fetch_done
 
-    def run(self):
+    def _fetch_videos(self):
         try:
             response = self._request_method.list(**self._request_params).execute()
         except RefreshError:
@@ -43,42 +45,45 @@ class VideoFetchingThread(threading.Thread):
             for tag in self._video_id_json_path:
                 video_id = video_id[tag]
 
-            to_add = dict()
+            if snippet is None or snippet["title"] is None or snippet["channelTitle"] is None:
+                continue
 
-            if snippet is not None:
-                to_add = {
-                    'title': snippet["title"],
-                    'creator': snippet["channelTitle"],
-                    'thumbnail': self._get_thumbnail_callback(snippet["thumbnails"]["medium"]["url"]),
-                    'url': f"https://www.youtube.com/watch?v={video_id}"
-                }
+            # Added right away, the thumbnail is filled in once downloaded.
+            to_add = VideoItem(snippet["title"], snippet["channelTitle"], f"https://www.youtube.com/watch?v={video_id}")
+            thumbnail_future = self._load_thumbnail_callback(to_add, snippet["thumbnails"]["medium"]["url"])
+            self._add_video_callback(to_add, thumbnail_future)
 
-            skip = False
-            for val in to_add.values():
-                if val is None:
-                    skip = True
-                    break
-            if not skip:
-                self._add_video_callback(to_add)
-
-        self._signal_fetch_done()
+    def run(self):
+        # Always signalled, readers waiting for videos would otherwise never wake up after a failed request.
+        try:
+            self._fetch_videos()
+        finally:
+            self._signal_fetch_done()
 
 
 class YoutubeStateBase:
-    def __init__(self, client, on_request_fail, get_thumbnail_callback, video_id_json_path=None, results_per_fetch=15):
+    def __init__(self, client, on_request_fail, load_thumbnail_callback, video_id_json_path=None,
+                 results_per_fetch=15):
         if video_id_json_path is None:
             video_id_json_path = ['id']
 
         self._client = client
         self._on_request_fail = on_request_fail
-        self._get_thumbnail = get_thumbnail_callback
+        self._load_thumbnail = load_thumbnail_callback
         self._video_id_json_path = video_id_json_path
 
+        # Thumbnail downloads, aligned with the videos they belong to.
+        self._videos_lock = threading.Lock()
+        self._videos_changed = threading.Condition(self._videos_lock)
         self._videos = list()
+        self._thumbnail_futures = list()
         self._index = 0
 
         self._ratio_viewed_trigger_fetch = 0.8
 
+        # Items further than this from the selection only keep their encoded thumbnail.
+        self._max_decoded_thumbnail_distance = 2
+
         self._request_method = None
         self._request_params = None
         self._next_page_token = None
@@ -87,21 +92,35 @@ class YoutubeStateBase:
         self._is_fetching = False
         self._fetching_thread = None
 
+        # Results of a fetch started before the last init_state belong to a previous query, and are discarded.
+        self._fetch_generation = 0
+
     def _set_fetch_request(self, fetch_request_method, fetch_request_params):
         self._request_method = fetch_request_method
         self._request_params = fetch_request_params
 
-    def _update_page_token_callback(self, page_token):
+    def _update_page_token_callback(self, fetch_generation, page_token):
+        if fetch_generation != self._fetch_generation:
+            return
         self._next_page_token = page_token
         self._request_method.pageToken = self._next_page_token
 
-    def _add_video_callback(self, video_data):
-        self._videos.append(video_data)
-
-    def _signal_fetch_done(self):
-        self._is_fetching = False
-
-    def _fetch_new(self, should_wait=False):
+    def _add_video_callback(self, fetch_generation, video_data, thumbnail_future):
+        with self._videos_changed:
+            if fetch_generation != self._fetch_generation:
+                return
+            self._videos.append(video_data)
+            self._thumbnail_futures.append(thumbnail_future)
+            self._videos_changed.notify_all()
+
+    def _signal_fetch_done(self, fetch_generation):
+        with self._videos_changed:
+            if fetch_generation != self._fetch_generation:
+                return
+            self._is_fetching = False
+            self._videos_changed.notify_all()
+
+    def _fetch_new(self):
         if self._request_method is None or self._is_fetching:
             return
 
@@ -111,13 +130,16 @@ class YoutubeStateBase:
         request_params |= {'maxResults': self._results_per_fetch}
         request_params |= {k: getattr(self, f'_fetch_request_param_{k}') for k in self._request_params}
 
+        fetch_generation = self._fetch_generation
+
         self._is_fetching = True
         self._fetching_thread = VideoFetchingThread(
-            self._add_video_callback,
-            self._update_page_token_callback,
-            self._get_thumbnail,
+            lambda video_data, thumbnail_future: self._add_video_callback(fetch_generation, video_data,
+                                                                          thumbnail_future),
+            lambda page_token: self._update_page_token_callback(fetch_generation, page_token),
+            self._load_thumbnail,
             self._on_request_fail,
-            self._signal_fetch_done,
+            lambda: self._signal_fetch_done(fetch_generation),
             self._request_method,
             request_params,
             self._video_id_json_path
@@ -125,20 +147,22 @@ class YoutubeStateBase:
         self._fetching_thread.daemon = True
         self._fetching_thread.start()
 
-        if should_wait:
-            self._fetching_thread.join()
-
     def init_state(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, f'_fetch_request_param_{k}', v)
 
         self._fetching_thread = None
 
-        self._videos.clear()
+        with self._videos_changed:
+            self._fetch_generation += 1
+            self._is_fetching = False
+            self._videos.clear()
+            self._thumbnail_futures.clear()
         self._index = 0
         self._next_page_token = None
 
-        self._fetch_new(should_wait=True)
+        # Not waited for, the first result is displayable as soon as it arrives and the rest keep streaming in.
+        self._fetch_new()
 
     def nav_prev(self):
         if self._index == 0:
@@ -153,8 +177,30 @@ class YoutubeStateBase:
         if self._index >= len(self._videos) * self._ratio_viewed_trigger_fetch:
             self._fetch_new()
 
+    def _release_distant_thumbnails(self):
+        for index, video_item in enumerate(self._videos):
+            if abs(index - self._index) > self._max_decoded_thumbnail_distance:
+                video_item.release_thumbnail()
+
+    def get_upcoming(self, count):
+        # The current video followed by the ones after it, the likeliest to be opened next.
+        return self._videos[self._index:self._index + count]
+
     @property
     def current(self):
-        if self._index >= len(self._videos):
-            return None
-        return self._videos[self._index]
+        with self._videos_changed:
+            while self._index >= len(self._videos) and self._is_fetching:
+                self._videos_changed.wait()
+            if self._index >= len(self._videos):
+                return None
+            video_item = self._videos[self._index]
+            thumbnail_future = self._thumbnail_futures[self._index]
+
+            self._release_distant_thumbnails()
+
+        # Only the shown video's thumbnail is waited for, the others keep downloading in the background.
+        thumbnail_future.result()
+        video_item.decode_thumbnail()
+
+        # A copy, so callers adding screen data to it never grow the stored item.
+        return video_item.to_dict()